@@ -1,43 +1,136 @@
-from flask import Flask, jsonify, request
-from flask_mysqldb import MySQL
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_httpauth import HTTPBasicAuth
 from http import HTTPStatus
 import jwt
 import datetime
 import json
+import base64
+import click
+import zlib
+import hashlib
+import hmac
+import os
+import queue
+import re
+import secrets
+import time
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import unquote_etag
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+from userstore import RevocationList, UserStore
+from cache import LRUCache, RedisCache
+from pool import PoolTimeout
+from storage import SCHEMA, Database, TransactionRolledBack
+from metrics import Gauge, RequestMetrics, TimedJSONProvider
+from querylog import QueryMonitor
+from compression import Compression, matching_etag
+from events import EventHub, LocalBroker, RedisBroker
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 
 app.config["MYSQL_HOST"] = "localhost"
 app.config["MYSQL_USER"] = "root"
 app.config["MYSQL_PASSWORD"] = "root"
 app.config["MYSQL_DB"] = "animal_shelter" 
+app.config["STORAGE_BACKEND"] = "mysql"
+app.config["SQLITE_PATH"] = "animal_shelter.db"
 app.config["SECRET_KEY"] = "vincent7"
-
-mysql = MySQL(app)
+app.config["PAGE_SIZE_DEFAULT"] = 50
+app.config["PAGE_SIZE_MAX"] = 200
+app.config["SEARCH_MAX_TERMS"] = 8
+app.config["STREAM_BATCH_SIZE"] = 500
+app.config["TOKEN_CACHE_SIZE"] = 1024
+app.config["TOKEN_REVOCATION_REFRESH"] = 10
+app.config["ACCESS_TOKEN_TTL"] = 900
+app.config["REFRESH_TOKEN_TTL"] = 14 * 24 * 3600
+app.config["CREDENTIAL_CACHE_SIZE"] = 1024
+app.config["CREDENTIAL_CACHE_TTL"] = 60
+app.config["BULK_MAX_ITEMS"] = 1000
+app.config["BATCH_MAX_ITEMS"] = 50
+app.config["SPECIES_CACHE_SIZE"] = 256
+app.config["SPECIES_CACHE_TTL"] = 300
+app.config["CACHE_REDIS_URL"] = None
+app.config["EVENTS_REDIS_URL"] = None
+app.config["EVENTS_HEARTBEAT"] = 15
+app.config["EVENTS_REPLAY_MAX"] = 1000
+app.config["MYSQL_POOL_MIN_SIZE"] = 2
+app.config["MYSQL_POOL_MAX_SIZE"] = 10
+app.config["MYSQL_POOL_TIMEOUT"] = 5
+app.config["MYSQL_POOL_RECYCLE"] = 3600
+app.config["MYSQL_POOL_PING_INTERVAL"] = 30
+app.config["QUERY_MONITOR_ENABLED"] = False
+app.config["SLOW_QUERY_THRESHOLD"] = 0.1
+app.config["SLOW_QUERY_EXPLAIN"] = False
+app.config["QUERY_BUDGET_DEFAULT"] = 20
+app.config["QUERY_BUDGET_FAIL"] = None
+app.config["COMPRESS_MIN_SIZE"] = 1024
+
+db = Database(app)
 auth = HTTPBasicAuth()
 
+# Per-endpoint latency, status codes, DB queries/time and JSON encoding time, served at /metrics
+metrics = RequestMetrics(app)
+db.query_hooks.append(metrics.record_query)
+
+# gzip/brotli for JSON responses of COMPRESS_MIN_SIZE bytes or more, per Accept-Encoding
+Compression(app)
+
+# Opt-in slow-query log and per-route statement budgets (QUERY_MONITOR_ENABLED)
+query_monitor = QueryMonitor(app, db)
+
 USER_DATA_FILE = "users.json"
+USER_DB_FILE = "users.db"
 
-def load_users():
-    try:
-        with open(USER_DATA_FILE, "r") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
+# users.json is only read to migrate existing accounts into the SQLite store
+users = UserStore(USER_DB_FILE, legacy_file=USER_DATA_FILE)
 
-def save_users(users):
-    with open(USER_DATA_FILE, "w") as file:
-        json.dump(users, file)
+# Tokens carry the user's role and token version as claims; this is the only user data
+# token validation reads, and it is reloaded from the store every TOKEN_REVOCATION_REFRESH seconds
+revoked_tokens = RevocationList(users, refresh=app.config["TOKEN_REVOCATION_REFRESH"],
+                                window=app.config["ACCESS_TOKEN_TTL"])
 
-users = load_users()
+# Successful Basic-auth verifications, keyed by an HMAC of the credentials so no plaintext is kept
+credential_cache = LRUCache(maxsize=app.config["CREDENTIAL_CACHE_SIZE"], ttl=app.config["CREDENTIAL_CACHE_TTL"])
+CREDENTIAL_CACHE_KEY = os.urandom(32)
+
+def credential_fingerprint(username, password):
+    message = username.encode() + b"\0" + password.encode()
+    return hmac.new(CREDENTIAL_CACHE_KEY, message, hashlib.sha256).digest()
 
 @auth.verify_password
 def verify_password(username, password):
-    if username in users and check_password_hash(users[username]['password'], password):
+    user = users.get(username)
+    if not user:
+        return None
+
+    # Entries record the hash and role they were verified against, so changing either invalidates them
+    key = credential_fingerprint(username, password)
+    if credential_cache.get(key) == (user['password'], user['role']):
         return username
+    if check_password_hash(user['password'], password):
+        credential_cache.set(key, (user['password'], user['role']))
+        return username
+
+# Access tokens are self-contained and never stored; they are renewed with a refresh token,
+# which is stored (hashed) and replaced by a new one each time it is used
+def issue_tokens(username, user, refresh_token=None):
+    access_token = jwt.encode({
+        "username": username,
+        "role": user['role'],
+        "ver": user['token_version'],
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=app.config["ACCESS_TOKEN_TTL"])
+    }, app.config["SECRET_KEY"], algorithm="HS256")
+    if refresh_token is None:
+        refresh_token = secrets.token_urlsafe(32)
+        users.add_refresh_token(refresh_token_hash(refresh_token), username, secrets.token_hex(16),
+                                time.time() + app.config["REFRESH_TOKEN_TTL"])
+    return jsonify({"token": access_token, "refresh_token": refresh_token,
+                    "expires_in": app.config["ACCESS_TOKEN_TTL"]})
+
+def refresh_token_hash(refresh_token):
+    return hashlib.sha256(refresh_token.encode()).digest()
 
 # Generate JWT
 @app.route("/login", methods=["POST"])
@@ -46,20 +139,29 @@ def login():
     username = data.get("username")
     password = data.get("password")
 
-    if username not in users or not check_password_hash(users[username]['password'], password):
+    user = users.get(username)
+    if not user or not check_password_hash(user['password'], password):
         return jsonify({"error": "Invalid credentials"}), 401
 
-    if 'token' not in users[username]:
-        token = jwt.encode({
-            "username": username,
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)
-        }, app.config["SECRET_KEY"], algorithm="HS256")
-        users[username]['token'] = token
-        save_users(users)
-    else:
-        token = users[username]['token']
+    return issue_tokens(username, user)
+
+# Exchange a refresh token for a new access token and a new refresh token
+@app.route("/token/refresh", methods=["POST"])
+def refresh_token():
+    data = request.get_json(silent=True) or {}
+    old_token = data.get("refresh_token")
+    if not old_token or not isinstance(old_token, str):
+        return jsonify({"error": "Refresh token is required"}), 400
+
+    new_token = secrets.token_urlsafe(32)
+    username = users.rotate_refresh_token(refresh_token_hash(old_token), refresh_token_hash(new_token),
+                                          time.time() + app.config["REFRESH_TOKEN_TTL"])
+    user = users.get(username) if username else None
+    if not user:
+        return jsonify({"error": "Invalid refresh token"}), 401
 
-    return jsonify({"token": token})
+    # The role and token version come from the store, so a role change applies from the next refresh
+    return issue_tokens(username, user, refresh_token=new_token)
 
 # Register a new user
 @app.route("/register", methods=["POST"])
@@ -75,47 +177,111 @@ def register():
     if username in users:
         return jsonify({"error": "User already exists"}), 400
 
-    users[username] = {
-        "password": generate_password_hash(password),
-        "role": role
-    }
-    save_users(users)
+    # The primary key settles races between two workers registering the same name
+    if not users.create(username, generate_password_hash(password), role):
+        return jsonify({"error": "User already exists"}), 400
 
     return jsonify({"message": "User registered successfully"}), 201
 
+# Claims of already-verified tokens, each dropped once the token's exp passes
+token_cache = LRUCache(maxsize=app.config["TOKEN_CACHE_SIZE"])
+
 # JWT Token validation
 def token_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
+        # Sub-requests of POST /batch run as the user the batch itself was authenticated as
+        if "batch_user" in g:
+            request.username, request.role = g.batch_user["username"], g.batch_user["role"]
+            return f(*args, **kwargs)
+
         token = request.headers.get("Authorization")
 
         if not token:
             return jsonify({"error": "Token is missing"}), 401
 
-        try:
-            decoded_token = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
-            request.username = decoded_token["username"]
-        except jwt.ExpiredSignatureError:
-            return jsonify({"error": "Token has expired"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"error": "Invalid token"}), 401
+        decoded_token = token_cache.get(token)
+        if decoded_token is None:
+            try:
+                decoded_token = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
+            except jwt.ExpiredSignatureError:
+                return jsonify({"error": "Token has expired"}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({"error": "Invalid token"}), 401
+            token_cache.set(token, decoded_token, expires_at=decoded_token.get("exp"))
+        if revoked_tokens.is_revoked(decoded_token):
+            return jsonify({"error": "Token has been revoked"}), 401
+        request.username = decoded_token["username"]
+        request.role = decoded_token.get("role")
 
         return f(*args, **kwargs)
     return wrapper
 
-# Role-based access control
+# Role-based access control, from the role claim token_required verified
 def role_required(required_roles):
     def decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            username = getattr(request, "username", None)
-            user_role = users.get(username, {}).get("role")
+            user_role = getattr(request, "role", None)
             if not user_role or user_role not in required_roles:
                 return jsonify({"error": "Access forbidden: insufficient permissions"}), 403
             return f(*args, **kwargs)
         return wrapper
     return decorator
 
+# Change a user's role; tokens issued with the old role stop working within TOKEN_REVOCATION_REFRESH seconds
+@app.cli.command("set-role")
+@click.argument("username")
+@click.argument("role")
+def set_role(username, role):
+    if username not in users:
+        raise click.ClickException(f"No such user: {username}")
+    users.update(username, role=role)
+    print(f"{username} is now {role}")
+
+# Create the tables and indexes on the configured storage backend
+@app.cli.command("init-db")
+def init_db():
+    db.storage.create_schema()
+    print(f"Schema created on the {app.config['STORAGE_BACKEND']} backend")
+
+@app.errorhandler(PoolTimeout)
+def pool_exhausted(e):
+    return jsonify({"error": "Database busy, try again later"}), HTTPStatus.SERVICE_UNAVAILABLE
+
+# Connection pool usage and checkout wait times
+@app.route("/pool-stats", methods=["GET"])
+@token_required
+@role_required(["admin"])
+def pool_stats():
+    return jsonify(db.storage.pool.stats()), HTTPStatus.OK
+
+# Hit/miss counters for the in-process caches
+@app.route("/cache-stats", methods=["GET"])
+@token_required
+@role_required(["admin"])
+def cache_stats():
+    return jsonify({
+        "token_cache": token_cache.stats(),
+        "credential_cache": credential_cache.stats(),
+        "species_cache": species_cache.stats()
+    }), HTTPStatus.OK
+
+metrics.registry.register(Gauge(
+    "db_pool_connections", "Connections in the database pool, by state.", ("state",),
+    lambda: {(state,): db.storage.pool.stats()[state] for state in ("in_use", "idle")}))
+metrics.registry.register(Gauge(
+    "cache_lookups_total", "Lookups in the in-process caches, by result.", ("cache", "result"),
+    lambda: {(name, result): cache.stats()[key]
+             for name, cache in (("token", token_cache), ("credential", credential_cache), ("species", species_cache))
+             for result, key in (("hit", "hits"), ("miss", "misses"))},
+    kind="counter"))
+
+# Prometheus scrape endpoint
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/")
 def hello_world():
     style = """
@@ -211,34 +377,349 @@ def hello_world():
 
 # Utility function to fetch a single row by ID
 def fetch_one(query, params):
-    cursor = mysql.connection.cursor()
-    cursor.execute(query, params)
-    result = cursor.fetchone()
-    cursor.close()
-    return result
+    cursor = db.connection.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
 
 # Utility function to fetch multiple rows
 def fetch_all(query, params=None):
-    cursor = mysql.connection.cursor()
-    if params:
+    cursor = db.connection.cursor()
+    try:
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+# Utility function to run a write statement; the closed cursor still carries rowcount and lastrowid
+def execute(query, params):
+    cursor = db.connection.cursor()
+    try:
         cursor.execute(query, params)
-    else:
-        cursor.execute(query)
-    results = cursor.fetchall()
-    cursor.close()
-    return results
+        return cursor
+    finally:
+        cursor.close()
+
+# Bump the change counters behind the collection ETags; call inside the write's
+# transaction, before commit. Deletes list dependent tables since they may cascade.
+def touch(*tables):
+    placeholders = ", ".join(["%s"] * len(tables))
+    execute(f"UPDATE Table_Version SET version = version + 1 WHERE table_name IN ({placeholders})", tables)
+
+# A pet's share of its species' row in Species_Stats, from a PET_STATS_QUERY row.
+# The summary is the sum of these over all pets, which is what lets writes adjust it
+# by deltas and rebuild_stats recompute it in one pass.
+PET_STATS_QUERY = (
+    "SELECT species_id, adopted, date_arrived, date_adopted, "
+    "(SELECT COUNT(*) FROM Adoption WHERE Adoption.pet_id = Pet.pet_id) FROM Pet"
+)
+
+def pet_contribution(row):
+    _, adopted, date_arrived, date_adopted, adoptions = row
+    stayed = date_arrived is not None and date_adopted is not None
+    return {
+        "pets": 1,
+        "in_shelter": 0 if adopted else 1,
+        "adoptions": int(adoptions),
+        "stay_days": (to_date(date_adopted) - to_date(date_arrived)).days if stayed else 0,
+        "stays": 1 if stayed else 0,
+    }
 
+def to_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+# Add `deltas` to a species' Species_Stats row; call inside the write's transaction, before commit
+def update_stats(species_id, sign=1, **deltas):
+    columns = ", ".join(f"{column} = {column} + %s" for column in deltas)
+    execute(f"UPDATE Species_Stats SET {columns} WHERE species_id = %s",
+            tuple(sign * value for value in deltas.values()) + (species_id,))
+
+# Start a write transaction by taking the Change_Log counter row; call before the write's
+# first statement, reads included. Every writer then locks rows in the same order, starting
+# with this one, so two writes cannot deadlock; and they append to the change feed in turn,
+# so change_ids are assigned in commit order and a feed reader never skips an entry that
+# commits late.
+def begin_write():
+    touch("Change_Log")
+
+# Append to the change feed; call inside a transaction opened with begin_write, before commit
+def record_change(table, operation, *row_ids):
+    g.changes_recorded = True
+    if row_ids:
+        values = ", ".join(["(%s, %s, %s)"] * len(row_ids))
+        params = [value for row_id in row_ids for value in (table, row_id, operation)]
+        execute(f"INSERT INTO Change_Log (table_name, row_id, operation) VALUES {values}", params)
+
+# Record deletes for the pets matching `where` and the rows that cascade from them, children
+# first; call before the DELETE, while the rows still exist
+def record_pet_deletes(where, params):
+    g.changes_recorded = True
+    for table, key in (("Adoption", "adoption_id"), ("Medical_Record", "treatment_id")):
+        execute(
+            f"INSERT INTO Change_Log (table_name, row_id, operation) SELECT %s, {key}, %s FROM {table} "
+            f"WHERE pet_id IN (SELECT pet_id FROM Pet WHERE {where})", (table, "delete", *params)
+        )
+    execute(
+        f"INSERT INTO Change_Log (table_name, row_id, operation) SELECT %s, pet_id, %s FROM Pet WHERE {where}",
+        ("Pet", "delete", *params)
+    )
+
+# Utility function to insert many rows with one executemany; returns their generated IDs
+def insert_many(query, rows):
+    cursor = db.connection.cursor()
+    try:
+        # Stop MySQLdb from splitting the batch into several INSERTs: a single multi-row
+        # INSERT gets consecutive auto-increment IDs starting at lastrowid
+        cursor.max_stmt_length = 1 << 30
+        cursor.executemany(query, rows)
+        return list(range(cursor.lastrowid, cursor.lastrowid + len(rows)))
+    finally:
+        cursor.close()
+
+# Check the body and ?mode= of a bulk request; returns an error message or None
+def check_bulk_request(items):
+    if request.args.get("mode", "atomic") not in ("atomic", "partial"):
+        return "mode must be 'atomic' or 'partial'"
+    if not isinstance(items, list) or not items:
+        return "Request body must be a non-empty array"
+    if len(items) > app.config["BULK_MAX_ITEMS"]:
+        return f"At most {app.config['BULK_MAX_ITEMS']} items can be sent at once"
+    return None
+
+# Validate and insert a batch in one transaction. In atomic mode any invalid item rejects the
+# whole batch; in partial mode valid items are inserted and the rest reported.
+# Returns ([{"index", "id"}], [{"index", "error"}]). `on_created(created)` runs before the commit.
+def bulk_insert(table, items, validate, query, to_row, on_created=None):
+    partial = request.args.get("mode") == "partial"
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        error = validate(item) if isinstance(item, dict) else "Item must be an object"
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            rows.append((index, to_row(item)))
+    if not rows or (errors and not partial):
+        return [], errors
+
+    try:
+        begin_write()
+        ids = insert_many(query, [row for _, row in rows])
+        created = [{"index": index, "id": new_id} for (index, _), new_id in zip(rows, ids)]
+    except Exception:
+        db.connection.rollback()
+        if not partial:
+            raise
+        # Retry row by row so one bad row (e.g. an unknown pet_id) does not sink the rest
+        begin_write()
+        created = []
+        for index, row in rows:
+            try:
+                created.append({"index": index, "id": execute(query, row).lastrowid})
+            except Exception as e:
+                errors.append({"index": index, "error": str(e)})
+        errors.sort(key=lambda error: error["index"])
+    if on_created:
+        on_created(created)
+    record_change(table, "insert", *(item["id"] for item in created))
+    touch(table)
+    db.connection.commit()
+    return created, errors
+
+# Response caches are per process unless CACHE_REDIS_URL points them at a shared Redis
+def make_response_cache(name, maxsize, ttl):
+    if app.config["CACHE_REDIS_URL"]:
+        import redis
+        return RedisCache(redis.Redis.from_url(app.config["CACHE_REDIS_URL"]), prefix=name, ttl=ttl)
+    return LRUCache(maxsize=maxsize, ttl=ttl)
+
+# Serve a GET route from `cache`, keyed by path and query string. Only 200 and 404
+# responses are stored; the route's write handlers are responsible for clearing it.
+def cached_response(cache):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if wants_stream():
+                return f(*args, **kwargs)
+
+            key = request.full_path
+            entry = cache.get(key)
+            if entry is not None:
+                etag = entry["headers"].get("ETag")
+                matched = matching_etag(unquote_etag(etag)[0]) if etag else None
+                if matched:
+                    response = Response(status=HTTPStatus.NOT_MODIFIED)
+                    response.set_etag(matched)
+                else:
+                    response = Response(entry["body"], status=entry["status"], headers=entry["headers"])
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code in (200, 404):
+                headers = {
+                    name: response.headers[name]
+                    for name in ("Content-Type", "X-Next-Cursor", "ETag") if name in response.headers
+                }
+                cache.set(key, {"body": response.get_data(as_text=True), "status": response.status_code, "headers": headers})
+            response.headers["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
+
+# Answer GETs with 304 Not Modified while the tables' change counters are unchanged.
+# The ETag covers the counters and the query string, so every page has its own tag.
+# Counters only ever increase, so their sum changes whenever any one of them does.
+def conditional_get(*tables):
+    placeholders = ", ".join(["%s"] * len(tables))
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if wants_stream():
+                return f(*args, **kwargs)
+
+            row = fetch_one(f"SELECT SUM(version) FROM Table_Version WHERE table_name IN ({placeholders})", tables)
+            version = int(row[0]) if row and row[0] is not None else 0
+            etag = f"{'+'.join(tables)}-{version}-{zlib.crc32(request.full_path.encode()):08x}"
+            matched = matching_etag(etag)
+            if matched:
+                response = Response(status=HTTPStatus.NOT_MODIFIED)
+                response.set_etag(matched)
+                return response
+
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code == HTTPStatus.OK:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+# Opaque keyset cursors: the position of the last row served, base64-encoded
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        position = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(position, dict) or not isinstance(position.get("after"), int):
+        raise ValueError("Invalid pagination cursor")
+    return position
+
+# Read limit/next from the query string, capping limit at PAGE_SIZE_MAX.
+# Returns the page size and the decoded cursor position (None on the first page).
+def page_args():
+    limit = request.args.get("limit", app.config["PAGE_SIZE_DEFAULT"])
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    limit = min(limit, app.config["PAGE_SIZE_MAX"])
+
+    token = request.args.get("next")
+    return limit, decode_cursor(token) if token else None
+
+def table_columns(table):
+    return [name for name, _ in SCHEMA[table][0]]
+
+# Parse ?fields= (comma-separated) against `allowed`; None when absent
+def requested_fields(allowed):
+    value = request.args.get("fields")
+    if value is None:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if not fields or unknown:
+        raise ValueError(f"fields must be a comma-separated list of: {', '.join(allowed)}")
+    return fields
+
+# Columns to SELECT for ?fields= and the serializer for rows of them. Without ?fields=
+# that is every column and `to_dict`; otherwise the requested columns plus the primary
+# key and `extra` columns the route needs for paging, which are left out of the output
+# unless requested. Returns (select list, selected column names, serializer).
+def field_selection(table, to_dict, extra=()):
+    columns = table_columns(table)
+    fields = requested_fields(columns)
+    if fields is None:
+        return "*", columns, to_dict
+    selected = [column for column in columns if column in fields or column == columns[0] or column in extra]
+    output = [(index, column) for index, column in enumerate(selected) if column in fields]
+    select = ", ".join(selected)
+    return select, selected, lambda row: {column: row[index] for index, column in output}
+
+# Rows are fetched with one look-ahead row; trim it and build the next cursor
+def paginate(rows, limit, position=lambda row: {"after": row[0]}):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(position(rows[-1]))
+    return rows, None
+
+def with_next_header(response, next_cursor):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+# Streaming is requested with ?stream=1 or Accept: application/x-ndjson
+def wants_stream():
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+# Stream every row as NDJSON from an unbuffered server-side cursor, one batch at a time
+def stream_rows(query, to_dict, params=()):
+    def generate():
+        cursor = db.stream_cursor()
+        try:
+            cursor.execute(query, params or None)
+            while True:
+                rows = cursor.fetchmany(app.config["STREAM_BATCH_SIZE"])
+                if not rows:
+                    break
+                yield "".join(app.json.dumps(to_dict(row)) + "\n" for row in rows)
+        finally:
+            cursor.close()
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 # CRUD for species
 
+def species_to_dict(s):
+    return {"species_id": s[0], "species_name": s[1]}
+
+species_cache = make_response_cache("species", app.config["SPECIES_CACHE_SIZE"], app.config["SPECIES_CACHE_TTL"])
+
 @app.route("/species", methods=["GET"])
+@cached_response(species_cache)
+@conditional_get("Species")
 def get_species():
-    species = fetch_all("SELECT * FROM Species")
+    try:
+        columns, _, to_dict = field_selection("Species", species_to_dict)
+        if wants_stream():
+            return stream_rows(f"SELECT {columns} FROM Species ORDER BY species_id", to_dict)
+        limit, position = page_args()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), HTTPStatus.BAD_REQUEST
+
+    after = position["after"] if position else 0
+    species = fetch_all(
+        f"SELECT {columns} FROM Species WHERE species_id > %s ORDER BY species_id LIMIT %s", (after, limit + 1)
+    )
     if not species:
         return jsonify({"error": "No species found"}), HTTPStatus.NOT_FOUND
-    species_data = [{"species_id": s[0], "species_name": s[1]} for s in species]
-    return jsonify({"success": True, "data": species_data, "total": len(species_data)}), HTTPStatus.OK
+    species, next_cursor = paginate(species, limit)
+    species_data = [to_dict(s) for s in species]
+    response = jsonify({"success": True, "data": species_data, "total": len(species_data), "next": next_cursor})
+    return with_next_header(response, next_cursor), HTTPStatus.OK
 
 @app.route("/species", methods=["POST"])
 @token_required
@@ -248,9 +729,13 @@ def create_species():
     if not species_name:
         return jsonify({"success": False, "error": "species_name is required"}), HTTPStatus.BAD_REQUEST
 
-    cursor = mysql.connection.cursor()
-    cursor.execute("INSERT INTO Species (species_name) VALUES (%s)", (species_name,))
-    mysql.connection.commit()
+    begin_write()
+    cursor = execute("INSERT INTO Species (species_name) VALUES (%s)", (species_name,))
+    execute("INSERT INTO Species_Stats (species_id) VALUES (%s)", (cursor.lastrowid,))
+    record_change("Species", "insert", cursor.lastrowid)
+    touch("Species")
+    db.connection.commit()
+    species_cache.clear()
     return jsonify({"success": True, "data": {"species_id": cursor.lastrowid, "species_name": species_name}}), HTTPStatus.CREATED
 
 @app.route("/species/<int:species_id>", methods=["PUT"])
@@ -260,9 +745,13 @@ def update_species(species_id):
     data = request.get_json()
     species_name = data.get("species_name")
 
-    cursor = mysql.connection.cursor()
-    cursor.execute("UPDATE Species SET species_name = %s WHERE species_id = %s", (species_name, species_id))
-    mysql.connection.commit()
+    begin_write()
+    cursor = execute("UPDATE Species SET species_name = %s WHERE species_id = %s", (species_name, species_id))
+    if cursor.rowcount:
+        record_change("Species", "update", species_id)
+    touch("Species")
+    db.connection.commit()
+    species_cache.clear()
     if cursor.rowcount == 0:
         return jsonify({"success": False, "error": "Species not found"}), HTTPStatus.NOT_FOUND
     return jsonify({"success": True, "message": "Species updated successfully"}), HTTPStatus.OK
@@ -271,23 +760,127 @@ def update_species(species_id):
 @token_required
 @role_required(["admin", "staff"]) 
 def delete_species(species_id):
-    cursor = mysql.connection.cursor()
-    cursor.execute("DELETE FROM Species WHERE species_id = %s", (species_id,))
-    mysql.connection.commit()
+    begin_write()
+    record_pet_deletes("species_id = %s", (species_id,))
+    cursor = execute("DELETE FROM Species WHERE species_id = %s", (species_id,))
+    if cursor.rowcount:
+        record_change("Species", "delete", species_id)
+    touch("Species", "Pet", "Adoption", "Medical_Record")
+    db.connection.commit()
+    species_cache.clear()
     if cursor.rowcount == 0:
         return jsonify({"success": False, "error": "Species not found"}), HTTPStatus.NOT_FOUND
     return jsonify({"success": True, "message": "Species deleted successfully"}), HTTPStatus.OK
 
 # CRUD for pets
-@app.route("/pets", methods=["GET"])
-def get_pets():
-    pets = fetch_all("SELECT * FROM Pet")
-    pets_data = [{
+PET_INSERT = (
+    "INSERT INTO Pet (name, species_id, breed_name, age, color, gender, date_arrived) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+
+def validate_pet(data):
+    if not data.get("name") or not isinstance(data.get("name"), str):
+        return "Name is required and must be a string"
+    if not data.get("species_id") or not isinstance(data.get("species_id"), int):
+        return "Species ID is required and must be an integer"
+    if data.get("age") is not None and not isinstance(data.get("age"), int):
+        return "Age must be an integer"
+    if not data.get("date_arrived"):
+        return "Arrival date is required"
+    return None
+
+def pet_to_dict(pet):
+    return {
         "pet_id": pet[0], "name": pet[1], "species_id": pet[2], "breed_name": pet[3], 
         "age": pet[4], "color": pet[5], "gender": pet[6], "adopted": pet[7], 
         "date_arrived": pet[8], "date_adopted": pet[9]
-    } for pet in pets]
-    return jsonify({"success": True, "data": pets_data, "total": len(pets_data)}), HTTPStatus.OK
+    }
+
+# Columns /pets can be sorted by
+PET_SORT_COLUMNS = ("pet_id", "date_arrived")
+
+# Turn the whitelisted /pets query parameters into parameterized WHERE clauses
+def pet_filters():
+    where, params = [], []
+
+    adopted = request.args.get("adopted")
+    if adopted is not None:
+        if adopted.lower() not in ("1", "0", "true", "false"):
+            raise ValueError("adopted must be true or false")
+        where.append("adopted = %s")
+        params.append(adopted.lower() in ("1", "true"))
+
+    species_id = request.args.get("species_id")
+    if species_id is not None:
+        if not species_id.isdigit():
+            raise ValueError("species_id must be an integer")
+        where.append("species_id = %s")
+        params.append(int(species_id))
+
+    gender = request.args.get("gender")
+    if gender:
+        where.append("gender = %s")
+        params.append(gender)
+
+    for arg, op in (("arrived_from", ">="), ("arrived_to", "<=")):
+        value = request.args.get(arg)
+        if value is not None:
+            try:
+                datetime.date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"{arg} must be a date in YYYY-MM-DD format")
+            where.append(f"date_arrived {op} %s")
+            params.append(value)
+
+    return where, params
+
+@app.route("/pets", methods=["GET"])
+@conditional_get("Pet")
+def get_pets():
+    try:
+        sort = request.args.get("sort", "pet_id")
+        columns, selected, to_dict = field_selection("Pet", pet_to_dict, extra=(sort.lstrip("-"),))
+        where, params = pet_filters()
+        if sort.lstrip("-") not in PET_SORT_COLUMNS:
+            raise ValueError(f"sort must be one of: {', '.join(PET_SORT_COLUMNS)} (prefix with - for descending)")
+        streaming = wants_stream()
+        limit, position = (None, None) if streaming else page_args()
+        if position and position.get("sort", "pet_id") != sort:
+            raise ValueError("Pagination cursor does not match sort order")
+        if position and sort.lstrip("-") != "pet_id" and not isinstance(position.get("key"), str):
+            raise ValueError("Invalid pagination cursor")
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), HTTPStatus.BAD_REQUEST
+
+    column = sort.lstrip("-")
+    direction, op = ("DESC", "<") if sort.startswith("-") else ("ASC", ">")
+    if column != "pet_id":
+        # Keyset comparisons cannot order NULLs, so undated pets are left out of date sorts
+        where.append(f"{column} IS NOT NULL")
+    if streaming:
+        # Filtered and sorted like the pages, but every matching pet in one response
+        query = f"SELECT {columns} FROM Pet"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        return stream_rows(f"{query} ORDER BY {column} {direction}, pet_id {direction}", to_dict, tuple(params))
+    if position and column == "pet_id":
+        where.append(f"pet_id {op} %s")
+        params.append(position["after"])
+    elif position:
+        where.append(f"({column}, pet_id) {op} (%s, %s)")
+        params.extend([position["key"], position["after"]])
+
+    query = f"SELECT {columns} FROM Pet"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY {column} {direction}, pet_id {direction} LIMIT %s"
+    pets = fetch_all(query, (*params, limit + 1))
+    pets, next_cursor = paginate(
+        pets, limit, lambda pet: {"after": pet[0], "sort": sort, "key": str(pet[selected.index(column)])}
+    )
+    pets_data = [to_dict(pet) for pet in pets]
+    response = jsonify({"success": True, "data": pets_data, "total": len(pets_data), "next": next_cursor})
+    return with_next_header(response, next_cursor), HTTPStatus.OK
 
 @app.route("/pets", methods=["POST"])
 @token_required
@@ -301,14 +894,44 @@ def create_pet():
     gender = data.get("gender")
     date_arrived = data.get("date_arrived")
 
-    cursor = mysql.connection.cursor()
-    cursor.execute(
-        "INSERT INTO Pet (name, species_id, breed_name, age, color, gender, date_arrived) VALUES (%s, %s, %s, %s, %s, %s, %s)", 
-        (name, species_id, breed_name, age, color, gender, date_arrived)
-    )
-    mysql.connection.commit()
+    begin_write()
+    cursor = execute(PET_INSERT, (name, species_id, breed_name, age, color, gender, date_arrived))
+    update_stats(species_id, pets=1, in_shelter=1)
+    record_change("Pet", "insert", cursor.lastrowid)
+    touch("Pet")
+    db.connection.commit()
     return jsonify({"success": True, "data": {"pet_id": cursor.lastrowid}}), HTTPStatus.CREATED
 
+def count_new_pets(pets):
+    per_species = {}
+    for pet in pets:
+        per_species[pet["species_id"]] = per_species.get(pet["species_id"], 0) + 1
+    for species_id, count in per_species.items():
+        update_stats(species_id, pets=count, in_shelter=count)
+
+@app.route("/pets/bulk", methods=["POST"])
+@query_monitor.budget(None)
+@token_required
+def create_pets_bulk():
+    items = request.get_json()
+    error = check_bulk_request(items)
+    if error:
+        return jsonify({"success": False, "error": error}), HTTPStatus.BAD_REQUEST
+
+    try:
+        created, errors = bulk_insert("Pet", items, validate_pet, PET_INSERT, lambda pet: (
+            pet["name"], pet["species_id"], pet.get("breed_name"), pet.get("age"),
+            pet.get("color"), pet.get("gender"), pet["date_arrived"]
+        ), on_created=lambda created: count_new_pets([items[item["index"]] for item in created]))
+    except Exception as e:
+        return jsonify({"success": False, "error": "Database error", "details": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+    data = [{"index": item["index"], "pet_id": item["id"]} for item in created]
+    if not created:
+        return jsonify({"success": False, "data": data, "errors": errors}), HTTPStatus.BAD_REQUEST
+    status = HTTPStatus.MULTI_STATUS if errors else HTTPStatus.CREATED
+    return jsonify({"success": not errors, "data": data, "errors": errors, "total": len(data)}), status
+
 @app.route("/pets/<int:pet_id>", methods=["PUT"])
 @token_required
 @role_required(["admin", "staff"])
@@ -321,12 +944,20 @@ def update_pet(pet_id):
     color = data.get("color")
     gender = data.get("gender")
 
-    cursor = mysql.connection.cursor()
-    cursor.execute(
+    begin_write()
+    before = fetch_one(PET_STATS_QUERY + " WHERE pet_id = %s", (pet_id,))
+    cursor = execute(
         "UPDATE Pet SET name = %s, species_id = %s, breed_name = %s, age = %s, color = %s, gender = %s WHERE pet_id = %s",
         (name, species_id, breed_name, age, color, gender, pet_id)
     )
-    mysql.connection.commit()
+    if before and before[0] != species_id:
+        contribution = pet_contribution(before)
+        update_stats(before[0], sign=-1, **contribution)
+        update_stats(species_id, **contribution)
+    if cursor.rowcount:
+        record_change("Pet", "update", pet_id)
+    touch("Pet")
+    db.connection.commit()
     if cursor.rowcount == 0:
         return jsonify({"error": "Pet not found"}), HTTPStatus.NOT_FOUND
     return jsonify({"message": "Pet updated successfully"}), HTTPStatus.OK
@@ -335,39 +966,129 @@ def update_pet(pet_id):
 @token_required
 @role_required(["admin", "staff"])
 def delete_pet(pet_id):
-    cursor = mysql.connection.cursor()
-    cursor.execute("DELETE FROM Pet WHERE pet_id = %s", (pet_id,))
-    mysql.connection.commit()
+    begin_write()
+    before = fetch_one(PET_STATS_QUERY + " WHERE pet_id = %s", (pet_id,))
+    record_pet_deletes("pet_id = %s", (pet_id,))
+    cursor = execute("DELETE FROM Pet WHERE pet_id = %s", (pet_id,))
+    if before and cursor.rowcount:
+        update_stats(before[0], sign=-1, **pet_contribution(before))
+    touch("Pet", "Adoption", "Medical_Record")
+    db.connection.commit()
     if cursor.rowcount == 0:
         return jsonify({"error": "Pet not found"}), HTTPStatus.NOT_FOUND
     return jsonify({"message": "Pet deleted successfully"}), HTTPStatus.OK
 
+# Everything the pet page shows in one response: the pet, its species name, its
+# adoption history and its medical records, each an indexed lookup on pet_id.
+# ?fields= may name Pet columns and these parts; parts left out are not queried.
+PROFILE_PARTS = ("species_name", "adoptions", "medical_records")
+
+@app.route("/pets/<int:pet_id>/profile", methods=["GET"])
+@conditional_get("Pet", "Species", "Adoption", "Medical_Record")
+def get_pet_profile(pet_id):
+    try:
+        fields = requested_fields(table_columns("Pet") + list(PROFILE_PARTS))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), HTTPStatus.BAD_REQUEST
+    wants = lambda field: fields is None or field in fields
+
+    pet_fields = None if fields is None else [field for field in fields if field not in PROFILE_PARTS]
+    columns = "Pet.*" if pet_fields is None else ", ".join(["Pet.pet_id"] + [f"Pet.{f}" for f in pet_fields])
+    pet = fetch_one(
+        f"SELECT {columns}, Species.species_name FROM Pet LEFT JOIN Species ON Species.species_id = Pet.species_id "
+        "WHERE Pet.pet_id = %s", (pet_id,)
+    )
+    if not pet:
+        return jsonify({"success": False, "error": "Pet not found"}), HTTPStatus.NOT_FOUND
+
+    if pet_fields is None:
+        profile = pet_to_dict(pet)
+    else:
+        profile = dict(zip(pet_fields, pet[1:-1]))
+    if wants("species_name"):
+        profile["species_name"] = pet[-1]
+    if wants("adoptions"):
+        adoptions = fetch_all("SELECT * FROM Adoption WHERE pet_id = %s ORDER BY adoption_date, adoption_id", (pet_id,))
+        profile["adoptions"] = [adoption_to_dict(adoption) for adoption in adoptions]
+    if wants("medical_records"):
+        records = fetch_all(
+            "SELECT * FROM Medical_Record WHERE pet_id = %s ORDER BY treatment_date, treatment_id", (pet_id,)
+        )
+        profile["medical_records"] = [medical_record_to_dict(record) for record in records]
+    return jsonify({"success": True, "data": profile}), HTTPStatus.OK
+
 # CRUD for adoptions
+def adoption_to_dict(adoption):
+    return {
+        "adoption_id": adoption[0],
+        "pet_id": adoption[1],
+        "first_name": adoption[2],
+        "last_name": adoption[3],
+        "address": adoption[4],
+        "email": adoption[5],
+        "phone": adoption[6],
+        "adoption_date": adoption[7],
+        "date_returned": adoption[8]
+    }
+
 @app.route("/adoptions", methods=["GET"])
+@conditional_get("Adoption")
 def get_adoptions():
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT * FROM Adoption")
-    adoptions = cursor.fetchall()
+    try:
+        columns, _, to_dict = field_selection("Adoption", adoption_to_dict)
+        if wants_stream():
+            return stream_rows(f"SELECT {columns} FROM Adoption ORDER BY adoption_id", to_dict)
+        limit, position = page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    after = position["after"] if position else 0
+    adoptions = fetch_all(
+        f"SELECT {columns} FROM Adoption WHERE adoption_id > %s ORDER BY adoption_id LIMIT %s", (after, limit + 1)
+    )
 
     if not adoptions:
         return jsonify({"error": "No adoptions found"}), 404
 
-    adoptions_list = [
-        {
-            "adoption_id": adoption[0],
-            "pet_id": adoption[1],
-            "first_name": adoption[2],
-            "last_name": adoption[3],
-            "address": adoption[4],
-            "email": adoption[5],
-            "phone": adoption[6],
-            "adoption_date": adoption[7],
-            "date_returned": adoption[8]
-        }
-        for adoption in adoptions
-    ]
+    adoptions, next_cursor = paginate(adoptions, limit)
+
+    adoptions_list = [to_dict(adoption) for adoption in adoptions]
 
-    return jsonify(adoptions_list), 200
+    return with_next_header(jsonify(adoptions_list), next_cursor), 200
+
+# Adopting a pet and returning it change the Pet row too: an adoption without a date_returned
+# marks the pet adopted as of adoption_date, and setting date_returned puts it back in the
+# shelter. Both happen in the adoption's own transaction, on the pet row read with
+# lock_pet, so two adoptions of the same pet cannot both succeed.
+def lock_pet(pet_id):
+    return fetch_one(PET_STATS_QUERY + " WHERE pet_id = %s" + db.storage.lock_rows, (pet_id,))
+
+# Utility function to set a locked pet's adoption state; `pet` is its row from lock_pet.
+# Returns False, changing nothing, if another transaction changed the state first.
+def set_adopted(pet_id, pet, adopted, date_adopted, adoptions=0):
+    cursor = execute(
+        "UPDATE Pet SET adopted = %s, date_adopted = %s WHERE pet_id = %s AND adopted = %s",
+        (adopted, date_adopted, pet_id, bool(pet[1]))
+    )
+    if cursor.rowcount == 0:
+        return False
+    before = pet_contribution(pet)
+    after = pet_contribution((pet[0], adopted, pet[2], date_adopted, pet[4] + adoptions))
+    deltas = {column: after[column] - before[column] for column in after if after[column] != before[column]}
+    if deltas:
+        update_stats(pet[0], **deltas)
+    record_change("Pet", "update", pet_id)
+    touch("Pet")
+    return True
+
+def validate_adoption_dates(data):
+    for field in ("adoption_date", "date_returned"):
+        if data.get(field) is not None:
+            try:
+                datetime.date.fromisoformat(data[field])
+            except (TypeError, ValueError):
+                return f"{field} must be a date in YYYY-MM-DD format"
+    return None
 
 @app.route("/adoptions", methods=["POST"])
 @token_required
@@ -377,6 +1098,7 @@ def add_adoption():
     first_name = data.get("first_name")
     last_name = data.get("last_name")
     adoption_date = data.get("adoption_date")
+    date_returned = data.get("date_returned")
 
     if not pet_id or not isinstance(pet_id, int):
         return jsonify({"error": "Pet ID is required and must be an integer"}), 400
@@ -386,16 +1108,33 @@ def add_adoption():
         return jsonify({"error": "Last name is required and must be a string"}), 400
     if not adoption_date:
         return jsonify({"error": "Adoption date is required"}), 400
+    error = validate_adoption_dates(data)
+    if error:
+        return jsonify({"error": error}), 400
 
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute(
+        begin_write()
+        pet = lock_pet(pet_id)
+        if pet is None:
+            db.connection.rollback()
+            return jsonify({"error": "Pet not found"}), 404
+        if date_returned is None:
+            # An adoption that is still open adopts the pet
+            if pet[1] or not set_adopted(pet_id, pet, True, adoption_date, adoptions=1):
+                db.connection.rollback()
+                return jsonify({"error": "Pet is already adopted"}), 409
+        else:
+            update_stats(pet[0], adoptions=1)
+        cursor = execute(
             "INSERT INTO Adoption (pet_id, first_name, last_name, address, email, phone, adoption_date, date_returned) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-            (pet_id, first_name, last_name, data.get("address"), data.get("email"), data.get("phone"), adoption_date, data.get("date_returned")),
+            (pet_id, first_name, last_name, data.get("address"), data.get("email"), data.get("phone"), adoption_date, date_returned),
         )
-        mysql.connection.commit()
+        record_change("Adoption", "insert", cursor.lastrowid)
+        touch("Adoption")
+        db.connection.commit()
         return jsonify({"message": "Adoption created successfully", "adoption_id": cursor.lastrowid}), 201
     except Exception as e:
+        db.connection.rollback()
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 @app.route("/adoptions/<int:adoption_id>", methods=["PUT"])
@@ -415,18 +1154,41 @@ def update_adoption(adoption_id):
         return jsonify({"error": "First name is required and must be a string"}), 400
     if not last_name or not isinstance(last_name, str):
         return jsonify({"error": "Last name is required and must be a string"}), 400
+    error = validate_adoption_dates(data)
+    if error:
+        return jsonify({"error": error}), 400
 
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute(
+        begin_write()
+        adoption = fetch_one("SELECT pet_id, date_returned FROM Adoption WHERE adoption_id = %s", (adoption_id,))
+        if adoption is None:
+            db.connection.rollback()
+            return jsonify({"error": "Adoption not found"}), 404
+        pet_id, was_open, is_open = adoption[0], adoption[1] is None, date_returned is None
+        if was_open or is_open:
+            pet = lock_pet(pet_id)
+            if is_open and not (was_open and pet[1] and to_date(pet[3]) == to_date(adoption_date)):
+                # Still or again the pet's current adoption: the pet is adopted as of adoption_date
+                if (not was_open and pet[1]) or not set_adopted(pet_id, pet, True, adoption_date):
+                    db.connection.rollback()
+                    return jsonify({"error": "Pet is already adopted"}), 409
+            elif not is_open and pet[1]:
+                # The pet was returned
+                set_adopted(pet_id, pet, False, None)
+
+        cursor = execute(
             "UPDATE Adoption SET first_name = %s, last_name = %s, address = %s, email = %s, phone = %s, adoption_date = %s, date_returned = %s WHERE adoption_id = %s",
             (first_name, last_name, address, email, phone, adoption_date, date_returned, adoption_id),
         )
-        mysql.connection.commit()
+        if cursor.rowcount:
+            record_change("Adoption", "update", adoption_id)
+        touch("Adoption")
+        db.connection.commit()
         if cursor.rowcount == 0:
             return jsonify({"error": "Adoption not found"}), 404
         return jsonify({"message": "Adoption updated successfully"}), 200
     except Exception as e:
+        db.connection.rollback()
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 @app.route("/adoptions/<int:adoption_id>", methods=["DELETE"])
@@ -434,39 +1196,77 @@ def update_adoption(adoption_id):
 @role_required(["admin", "staff"])
 def delete_adoption(adoption_id):
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("DELETE FROM Adoption WHERE adoption_id = %s", (adoption_id,))
-        mysql.connection.commit()
+        begin_write()
+        adoption = fetch_one("SELECT pet_id, date_returned FROM Adoption WHERE adoption_id = %s", (adoption_id,))
+        pet = lock_pet(adoption[0]) if adoption else None
+        cursor = execute("DELETE FROM Adoption WHERE adoption_id = %s", (adoption_id,))
+        if pet and cursor.rowcount:
+            # Deleting the pet's open adoption puts it back in the shelter, as a return does
+            if not (adoption[1] is None and pet[1] and set_adopted(adoption[0], pet, False, None, adoptions=-1)):
+                update_stats(pet[0], sign=-1, adoptions=1)
+        if cursor.rowcount:
+            record_change("Adoption", "delete", adoption_id)
+        touch("Adoption")
+        db.connection.commit()
 
         if cursor.rowcount == 0:
             return jsonify({"error": "Adoption not found"}), 404
 
         return jsonify({"message": "Adoption deleted successfully"}), 200
     except Exception as e:
+        db.connection.rollback()
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
 # CRUD for medical records
+MEDICAL_RECORD_INSERT = (
+    "INSERT INTO Medical_Record (pet_id, treatment_date, treatment_details, veterinarian) VALUES (%s, %s, %s, %s)"
+)
+
+def validate_medical_record(data):
+    if not data.get("pet_id") or not isinstance(data.get("pet_id"), int):
+        return "Pet ID is required and must be an integer"
+    if not data.get("treatment_date"):
+        return "Treatment date is required"
+    if not data.get("treatment_details") or not isinstance(data.get("treatment_details"), str):
+        return "Treatment details are required and must be a string"
+    if not data.get("veterinarian") or not isinstance(data.get("veterinarian"), str):
+        return "Veterinarian name is required and must be a string"
+    return None
+
+def medical_record_to_dict(record):
+    return {
+        "treatment_id": record[0],
+        "pet_id": record[1],
+        "treatment_date": record[2],
+        "treatment_details": record[3],
+        "veterinarian": record[4]
+    }
+
 @app.route("/medical_records", methods=["GET"])
+@conditional_get("Medical_Record")
 def get_medical_records():
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT * FROM Medical_Record")
-    records = cursor.fetchall()
+    try:
+        columns, _, to_dict = field_selection("Medical_Record", medical_record_to_dict)
+        if wants_stream():
+            return stream_rows(f"SELECT {columns} FROM Medical_Record ORDER BY treatment_id", to_dict)
+        limit, position = page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    after = position["after"] if position else 0
+    records = fetch_all(
+        f"SELECT {columns} FROM Medical_Record WHERE treatment_id > %s ORDER BY treatment_id LIMIT %s",
+        (after, limit + 1)
+    )
 
     if not records:
         return jsonify({"error": "No medical records found"}), 404
 
-    records_list = [
-        {
-            "treatment_id": record[0],
-            "pet_id": record[1],
-            "treatment_date": record[2],
-            "treatment_details": record[3],
-            "veterinarian": record[4]
-        }
-        for record in records
-    ]
+    records, next_cursor = paginate(records, limit)
+
+    records_list = [to_dict(record) for record in records]
 
-    return jsonify(records_list), 200
+    return with_next_header(jsonify(records_list), next_cursor), 200
 
 @app.route("/medical_records", methods=["POST"])
 @token_required
@@ -477,26 +1277,43 @@ def add_medical_record():
     treatment_details = data.get("treatment_details")
     veterinarian = data.get("veterinarian")
 
-    if not pet_id or not isinstance(pet_id, int):
-        return jsonify({"error": "Pet ID is required and must be an integer"}), 400
-    if not treatment_date:
-        return jsonify({"error": "Treatment date is required"}), 400
-    if not treatment_details or not isinstance(treatment_details, str):
-        return jsonify({"error": "Treatment details are required and must be a string"}), 400
-    if not veterinarian or not isinstance(veterinarian, str):
-        return jsonify({"error": "Veterinarian name is required and must be a string"}), 400
+    error = validate_medical_record(data)
+    if error:
+        return jsonify({"error": error}), 400
 
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute(
-            "INSERT INTO Medical_Record (pet_id, treatment_date, treatment_details, veterinarian) VALUES (%s, %s, %s, %s)",
-            (pet_id, treatment_date, treatment_details, veterinarian),
-        )
-        mysql.connection.commit()
+        begin_write()
+        cursor = execute(MEDICAL_RECORD_INSERT, (pet_id, treatment_date, treatment_details, veterinarian))
+        record_change("Medical_Record", "insert", cursor.lastrowid)
+        touch("Medical_Record")
+        db.connection.commit()
         return jsonify({"message": "Medical record created successfully", "treatment_id": cursor.lastrowid}), 201
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
+@app.route("/medical_records/bulk", methods=["POST"])
+@query_monitor.budget(None)
+@token_required
+def add_medical_records_bulk():
+    items = request.get_json()
+    error = check_bulk_request(items)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        created, errors = bulk_insert("Medical_Record", items, validate_medical_record, MEDICAL_RECORD_INSERT, lambda record: (
+            record["pet_id"], record["treatment_date"], record["treatment_details"], record["veterinarian"]
+        ))
+    except Exception as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+    treatment_ids = [{"index": item["index"], "treatment_id": item["id"]} for item in created]
+    if not created:
+        return jsonify({"error": "No medical records created", "errors": errors}), 400
+    if errors:
+        return jsonify({"message": "Some medical records were not created", "created": treatment_ids, "errors": errors}), 207
+    return jsonify({"message": "Medical records created successfully", "created": treatment_ids, "errors": []}), 201
+
 @app.route("/medical_records/<int:treatment_id>", methods=["PUT"])
 @token_required
 @role_required(["admin", "staff"])
@@ -514,12 +1331,15 @@ def update_medical_record(treatment_id):
         return jsonify({"error": "Veterinarian name is required and must be a string"}), 400
 
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute(
+        begin_write()
+        cursor = execute(
             "UPDATE Medical_Record SET treatment_date = %s, treatment_details = %s, veterinarian = %s WHERE treatment_id = %s",
             (treatment_date, treatment_details, veterinarian, treatment_id),
         )
-        mysql.connection.commit()
+        if cursor.rowcount:
+            record_change("Medical_Record", "update", treatment_id)
+        touch("Medical_Record")
+        db.connection.commit()
         if cursor.rowcount == 0:
             return jsonify({"error": "Medical record not found"}), 404
         return jsonify({"message": "Medical record updated successfully"}), 200
@@ -531,9 +1351,12 @@ def update_medical_record(treatment_id):
 @role_required(["admin", "staff"])
 def delete_medical_record(treatment_id):
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("DELETE FROM Medical_Record WHERE treatment_id = %s", (treatment_id,))
-        mysql.connection.commit()
+        begin_write()
+        cursor = execute("DELETE FROM Medical_Record WHERE treatment_id = %s", (treatment_id,))
+        if cursor.rowcount:
+            record_change("Medical_Record", "delete", treatment_id)
+        touch("Medical_Record")
+        db.connection.commit()
 
         if cursor.rowcount == 0:
             return jsonify({"error": "Medical record not found"}), 404
@@ -542,6 +1365,324 @@ def delete_medical_record(treatment_id):
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 
+# Full-text search over pet names and breeds or medical record notes and vets, served
+# from the backend's text index. Results are ranked, so pages are counted by offset.
+SEARCH_TYPES = {"pets": ("Pet", pet_to_dict), "medical_records": ("Medical_Record", medical_record_to_dict)}
+
+@app.route("/search", methods=["GET"])
+@conditional_get("Pet", "Medical_Record")
+def search():
+    terms = re.findall(r"\w+", request.args.get("q", "").lower())
+    kind = request.args.get("type", "pets")
+    try:
+        if not terms:
+            raise ValueError("q must contain at least one word")
+        if len(terms) > app.config["SEARCH_MAX_TERMS"]:
+            raise ValueError(f"q can contain at most {app.config['SEARCH_MAX_TERMS']} words")
+        if kind not in SEARCH_TYPES:
+            raise ValueError(f"type must be one of: {', '.join(SEARCH_TYPES)}")
+        limit, position = page_args()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), HTTPStatus.BAD_REQUEST
+
+    table, to_dict = SEARCH_TYPES[kind]
+    offset = position["after"] if position else 0
+    query, params = db.storage.search_statement(table, terms)
+    rows = fetch_all(query, params + (limit + 1, offset))
+    rows, next_cursor = paginate(rows, limit, position=lambda row: {"after": offset + limit})
+    results = [{**to_dict(row[:-1]), "score": round(float(row[-1]), 4)} for row in rows]
+    response = jsonify({"success": True, "data": results, "total": len(results), "next": next_cursor})
+    return with_next_header(response, next_cursor), HTTPStatus.OK
+
+# Change feed: every insert, update and delete on the four resource tables after the
+# `since` cursor, oldest first. Inserts and updates carry the row as it is now (null
+# if it has since been deleted). `next` is always set; pass it back as `since`.
+CHANGE_TABLES = {
+    "Species": species_to_dict,
+    "Pet": pet_to_dict,
+    "Adoption": adoption_to_dict,
+    "Medical_Record": medical_record_to_dict,
+}
+
+# Up to `limit` change-log entries after `after` with their current rows, plus whether more follow
+def changes_after(after, limit):
+    changes = fetch_all(
+        "SELECT change_id, table_name, row_id, operation FROM Change_Log WHERE change_id > %s "
+        "ORDER BY change_id LIMIT %s", (after, limit + 1)
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Current rows for the inserts and updates, one primary-key lookup per table
+    current = {}
+    for table, to_dict in CHANGE_TABLES.items():
+        ids = sorted({row_id for _, name, row_id, operation in changes if name == table and operation != "delete"})
+        if ids:
+            key = table_columns(table)[0]
+            placeholders = ", ".join(["%s"] * len(ids))
+            for row in fetch_all(f"SELECT * FROM {table} WHERE {key} IN ({placeholders})", ids):
+                current[(table, row[0])] = to_dict(row)
+
+    data = [
+        {"change_id": change_id, "table": table, "id": row_id, "operation": operation,
+         "data": None if operation == "delete" else current.get((table, row_id))}
+        for change_id, table, row_id, operation in changes
+    ]
+    return data, has_more
+
+@app.route("/changes", methods=["GET"])
+@conditional_get("Change_Log")
+def get_changes():
+    try:
+        limit, _ = page_args()
+        since = request.args.get("since")
+        after = decode_cursor(since)["after"] if since else 0
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), HTTPStatus.BAD_REQUEST
+
+    data, has_more = changes_after(after, limit)
+    next_cursor = encode_cursor({"after": data[-1]["change_id"] if data else after})
+    response = jsonify({"success": True, "data": data, "total": len(data), "next": next_cursor, "has_more": has_more})
+    return with_next_header(response, next_cursor), HTTPStatus.OK
+
+# Live activity over Server-Sent Events: the change feed, pushed as it happens. Each event's
+# id is its change_id and its type "<table>.<operation>", e.g. "Adoption.insert".
+def make_event_broker():
+    if app.config["EVENTS_REDIS_URL"]:
+        import redis
+        return RedisBroker(redis.Redis.from_url(app.config["EVENTS_REDIS_URL"]))
+    return LocalBroker()
+
+def load_events(after):
+    with app.app_context():
+        return changes_after(after, app.config["PAGE_SIZE_MAX"])[0]
+
+def latest_change_id():
+    row = fetch_one("SELECT MAX(change_id) FROM Change_Log", ())
+    return row[0] if row and row[0] is not None else 0
+
+event_hub = EventHub(make_event_broker(), load_events, latest_change_id)
+
+# Wake the event dispatchers once a request that recorded changes has committed them
+@app.after_request
+def publish_changes(response):
+    if g.pop("changes_recorded", False):
+        event_hub.publish()
+    return response
+
+def format_event(event):
+    return f"id: {event['change_id']}\nevent: {event['table']}.{event['operation']}\ndata: {app.json.dumps(event)}\n\n"
+
+@app.route("/events", methods=["GET"])
+def events():
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    try:
+        after = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        return jsonify({"success": False, "error": "Last-Event-ID must be an integer"}), HTTPStatus.BAD_REQUEST
+
+    # Subscribe before replaying so nothing committed in between is missed; the stream
+    # itself runs outside the app context and holds no database connection
+    subscriber = event_hub.subscribe()
+    backlog = []
+    if after is not None:
+        backlog, has_more = changes_after(after, app.config["EVENTS_REPLAY_MAX"])
+        if has_more:
+            event_hub.unsubscribe(subscriber)
+            resync = "event: resync\ndata: {\"error\": \"Too far behind; resynchronise from /changes\"}\n\n"
+            return Response(resync, mimetype="text/event-stream")
+        if backlog:
+            after = backlog[-1]["change_id"]
+    heartbeat = app.config["EVENTS_HEARTBEAT"]
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield format_event(event)
+            while True:
+                try:
+                    event = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    return  # fell too far behind; the client reconnects with Last-Event-ID
+                if after is None or event["change_id"] > after:
+                    yield format_event(event)
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Batch requests: run an ordered list of sub-requests against the other routes in one
+# round trip, authenticated once. A string "$<index>.<key>..." in a later item's path or
+# body stands for a value from an earlier item's response, e.g. "$0.data.pet_id".
+BATCH_REFERENCE = re.compile(r"\$(\d+)((?:\.\w+)*)")
+BATCH_EXCLUDED = {"batch", "events"}
+
+class BatchReferenceError(ValueError):
+    pass
+
+def resolve_reference(match, results):
+    index = int(match.group(1))
+    if index >= len(results):
+        raise BatchReferenceError(f"{match.group(0)} refers to an item that has not run yet")
+    if results[index]["status"] >= 400:
+        raise BatchReferenceError(f"{match.group(0)} refers to an item that failed")
+    value = results[index]["body"]
+    for key in filter(None, match.group(2).split(".")):
+        try:
+            value = value[int(key)] if isinstance(value, list) else value[key]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise BatchReferenceError(f"{match.group(0)} does not exist in item {index}'s response")
+    return value
+
+# Replace references in a sub-request's path or body; a string that is one whole
+# reference takes the referenced value as is, so IDs stay integers
+def resolve_references(value, results):
+    if isinstance(value, str):
+        whole = BATCH_REFERENCE.fullmatch(value)
+        if whole:
+            return resolve_reference(whole, results)
+        return BATCH_REFERENCE.sub(lambda match: str(resolve_reference(match, results)), value)
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    return value
+
+# Dispatch one sub-request straight to its view function, in the batch's app context
+# (so it shares the batch's database connection) and without the per-request hooks
+def run_sub_request(method, path, body):
+    with app.test_request_context(path, method=method, json=body):
+        try:
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            if request.url_rule.endpoint in BATCH_EXCLUDED:
+                return HTTPStatus.BAD_REQUEST, {"error": f"{path} cannot be used in a batch"}
+            rv = app.view_functions[request.url_rule.endpoint](**request.view_args)
+            response = app.make_response(rv)
+        except HTTPException as e:
+            response = app.make_response(app.handle_user_exception(e))
+        except Exception:
+            # Don't let the next item commit whatever this one left half done
+            app.logger.exception("Batch request %s %s failed", method, path)
+            db.connection.rollback()
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+        data = response.get_data()
+        return response.status_code, app.json.loads(data) if response.is_json and data else None
+
+def check_batch_request(data):
+    items = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return "Request body must be an object with a non-empty 'requests' array"
+    if len(items) > app.config["BATCH_MAX_ITEMS"]:
+        return f"At most {app.config['BATCH_MAX_ITEMS']} requests can be sent at once"
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str) or not item["path"].startswith("/"):
+            return f"Request {index} must be an object with a 'path' starting with '/'"
+        if item.get("method", "GET").upper() not in ("GET", "POST", "PUT", "DELETE"):
+            return f"Request {index} has an unsupported method"
+    return None
+
+def run_batch(items, stop_on_error):
+    results = []
+    for item in items:
+        try:
+            path = resolve_references(item["path"], results)
+            body = resolve_references(item.get("body"), results)
+        except BatchReferenceError as e:
+            status, response_body = HTTPStatus.FAILED_DEPENDENCY, {"error": str(e)}
+        else:
+            status, response_body = run_sub_request(item.get("method", "GET").upper(), path, body)
+        results.append({"status": int(status), "body": response_body})
+        if stop_on_error and status >= 400:
+            break
+    return results
+
+# With "atomic": true every sub-request runs in one transaction, committed only if all of
+# them succeed; processing stops at the first failure and nothing is kept.
+@app.route("/batch", methods=["POST"])
+@query_monitor.budget(None)
+@token_required
+def batch():
+    data = request.get_json(silent=True)
+    error = check_batch_request(data)
+    if error:
+        return jsonify({"success": False, "error": error}), HTTPStatus.BAD_REQUEST
+
+    g.batch_user = {"username": request.username, "role": request.role}
+    try:
+        if not data.get("atomic"):
+            results = run_batch(data["requests"], stop_on_error=False)
+            failed = any(result["status"] >= 400 for result in results)
+            status = HTTPStatus.MULTI_STATUS if failed else HTTPStatus.OK
+            return jsonify({"success": not failed, "results": results}), status
+
+        try:
+            with db.transaction() as transaction:
+                results = run_batch(data["requests"], stop_on_error=True)
+                if results[-1]["status"] >= 400:
+                    transaction["rollback"] = True
+        except TransactionRolledBack:
+            return jsonify({"success": False, "rolled_back": True, "results": results}), HTTPStatus.BAD_REQUEST
+        finally:
+            species_cache.clear()
+        return jsonify({"success": True, "results": results}), HTTPStatus.OK
+    finally:
+        g.pop("batch_user", None)
+
+# Shelter statistics, served from the Species_Stats summary the write handlers keep current
+@app.route("/stats", methods=["GET"])
+@conditional_get("Species", "Pet", "Adoption", "Species_Stats")
+def get_stats():
+    rows = fetch_all(
+        "SELECT Species.species_id, species_name, pets, in_shelter, adoptions, stay_days, stays "
+        "FROM Species_Stats JOIN Species ON Species.species_id = Species_Stats.species_id ORDER BY Species.species_id"
+    )
+    def summarize(pets, in_shelter, adoptions, stay_days, stays):
+        return {
+            "pets": int(pets), "occupancy": int(in_shelter), "adoptions": int(adoptions),
+            "average_stay_days": round(stay_days / stays, 1) if stays else None
+        }
+    species = [{"species_id": row[0], "species_name": row[1], **summarize(*row[2:])} for row in rows]
+    totals = summarize(*(sum(row[i] for row in rows) for i in range(2, 7)))
+    return jsonify({"success": True, "data": {**totals, "species": species}}), HTTPStatus.OK
+
+# Recompute Species_Stats from Pet and Adoption in one pass. The write lock is taken before
+# the scan, so no write can commit between reading the pets and replacing the summary.
+def rebuild_stats():
+    totals = {}
+    begin_write()
+    cursor = db.stream_cursor()
+    try:
+        cursor.execute(PET_STATS_QUERY)
+        while True:
+            rows = cursor.fetchmany(app.config["STREAM_BATCH_SIZE"])
+            if not rows:
+                break
+            for row in rows:
+                species = totals.setdefault(row[0], dict.fromkeys(("pets", "in_shelter", "adoptions", "stay_days", "stays"), 0))
+                for column, value in pet_contribution(row).items():
+                    species[column] += value
+    finally:
+        cursor.close()
+
+    execute("DELETE FROM Species_Stats", ())
+    execute("INSERT INTO Species_Stats (species_id) SELECT species_id FROM Species", ())
+    for species_id, columns in totals.items():
+        update_stats(species_id, **columns)
+    touch("Species_Stats")
+    db.connection.commit()
+    return len(totals)
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    count = rebuild_stats()
+    print(f"Rebuilt statistics for {count} species")
+
 
 if __name__ == "__main__":
     app.run(debug=True)
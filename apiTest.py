@@ -1,13 +1,52 @@
+import json
+import datetime
+import decimal
+import gzip
+import threading
+import jwt
 import pytest
-from api import app
+from werkzeug.security import generate_password_hash
+import api
+from api import app, encode_cursor
+from userstore import RevocationList, UserStore
+from cache import LRUCache
+from pool import ConnectionPool, PoolTimeout
+from storage import SQLiteStorage
+from querylog import QueryBudgetExceeded, describe_params
+import fastjson
+from events import EventHub, LocalBroker
 
 @pytest.fixture
 def mock_db(mocker):
-    mock_conn = mocker.patch('flask_mysqldb.MySQL.connection')
+    mock_conn = mocker.patch('storage.Database.connection')
     mock_cursor = mocker.MagicMock()
     mock_conn.cursor.return_value = mock_cursor
+    api.species_cache.clear()
     return mock_cursor
 
+def auth_headers(username="tester", expires_in=3600, role=None, ver=0):
+    token = jwt.encode({
+        "username": username,
+        "role": role,
+        "ver": ver,
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=expires_in)
+    }, app.config["SECRET_KEY"], algorithm="HS256")
+    return {"Authorization": token}
+
+@pytest.fixture
+def sqlite_db(monkeypatch):
+    storage = SQLiteStorage(":memory:")
+    monkeypatch.setattr(api.db, "storage", storage)
+    api.species_cache.clear()
+    return storage
+
+@pytest.fixture
+def user_store(tmp_path, monkeypatch):
+    store = UserStore(str(tmp_path / "users.db"))
+    monkeypatch.setattr(api, "users", store)
+    monkeypatch.setattr(api, "revoked_tokens", RevocationList(store, refresh=0, window=app.config["ACCESS_TOKEN_TTL"]))
+    return store
+
 #Species test
 def test_get_species_empty(mock_db):
     mock_db.fetchall.return_value = [] 
@@ -278,6 +317,57 @@ def test_delete_adoption_success(mock_db):
     assert response.status_code == 200
     assert b"Adoption deleted successfully" in response.data
 
+def test_adoption_adopts_pet_once(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    adoption = {"pet_id": 1, "first_name": "Jane", "last_name": "Doe", "adoption_date": "2024-01-11"}
+
+    first = client.post('/adoptions', headers=auth_headers(), json=adoption)
+    second = client.post('/adoptions', headers=auth_headers(), json=dict(adoption, first_name="John"))
+    pet = client.get('/pets/1/profile').json["data"]
+    stats = client.get('/stats').json["data"]
+
+    assert (first.status_code, second.status_code) == (201, 409)
+    assert (pet["adopted"], pet["date_adopted"]) == (1, "2024-01-11")
+    assert [a["first_name"] for a in pet["adoptions"]] == ["Jane"]
+    assert (stats["occupancy"], stats["adoptions"], stats["average_stay_days"]) == (0, 1, 10.0)
+
+def test_adoption_return_puts_pet_back(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers(role="staff"))
+    client.post('/pets', headers=auth_headers(role="staff"), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    adoption = {"pet_id": 1, "first_name": "Jane", "last_name": "Doe", "adoption_date": "2024-01-11"}
+    client.post('/adoptions', headers=auth_headers(role="staff"), json=adoption)
+
+    response = client.put('/adoptions/1', headers=auth_headers(role="staff"), json=dict(adoption, date_returned="2024-02-01"))
+    pet = client.get('/pets/1/profile').json["data"]
+    readopted = client.post('/adoptions', headers=auth_headers(role="staff"), json=dict(adoption, adoption_date="2024-03-01"))
+    reopened = client.put('/adoptions/1', headers=auth_headers(role="staff"), json=adoption)
+    stats = client.get('/stats').json["data"]
+
+    assert response.status_code == 200
+    assert (pet["adopted"], pet["date_adopted"]) == (0, None)
+    assert (readopted.status_code, reopened.status_code) == (201, 409)
+    assert (stats["occupancy"], stats["adoptions"], stats["average_stay_days"]) == (0, 2, 60.0)
+
+def test_deleting_open_adoption_puts_pet_back(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    adoption = {"pet_id": 1, "first_name": "Jane", "last_name": "Doe", "adoption_date": "2024-01-05"}
+    client.post('/adoptions', headers=auth_headers(), json=adoption)
+
+    response = client.delete('/adoptions/1', headers=auth_headers(role="staff"))
+    pet = client.get('/pets/1/profile').json["data"]
+    stats = client.get('/stats').json["data"]
+    readopted = client.post('/adoptions', headers=auth_headers(), json=adoption)
+
+    assert response.status_code == 200
+    assert (pet["adopted"], pet["date_adopted"], pet["adoptions"]) == (0, None, [])
+    assert (stats["occupancy"], stats["adoptions"], stats["average_stay_days"]) == (1, 0, None)
+    assert readopted.status_code == 201
+
 #Medical record test
 def test_get_medical_records_empty(mock_db):
     mock_db.fetchall.return_value = [] 
@@ -366,5 +456,1086 @@ def test_delete_medical_record_success(mock_db):
     assert response.status_code == 200
     assert b"Medical record deleted successfully" in response.data
 
+#User store test
+def test_register_and_login(user_store):
+    client = app.test_client()
+    response = client.post('/register', json={"username": "alice", "password": "secret", "role": "staff"})
+    assert response.status_code == 201
+
+    response = client.post('/login', json={"username": "alice", "password": "secret"})
+    assert response.status_code == 200
+    assert b"token" in response.data
+
+def test_register_duplicate(user_store):
+    client = app.test_client()
+    client.post('/register', json={"username": "alice", "password": "secret"})
+    response = client.post('/register', json={"username": "alice", "password": "other"})
+
+    assert response.status_code == 400
+    assert b"User already exists" in response.data
+
+def test_user_store_shared_between_workers(user_store):
+    other_worker = UserStore(user_store.path)
+    assert other_worker.create("bob", "hash", "admin")
+
+    assert "bob" in user_store
+    assert user_store.get("bob")["role"] == "admin"
+
+def test_user_store_imports_legacy_file(tmp_path):
+    legacy = tmp_path / "users.json"
+    legacy.write_text(json.dumps({"carol": {"password": "hash", "role": "staff"}}))
+
+    store = UserStore(str(tmp_path / "users.db"), legacy_file=str(legacy))
+
+    assert store.get("carol")["role"] == "staff"
+
+def test_login_token_carries_role(user_store, mock_db, mocker):
+    user_store.create("alice", generate_password_hash("secret"), "admin")
+    client = app.test_client()
+    token = client.post('/login', json={"username": "alice", "password": "secret"}).json["token"]
+    claims = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
+    lookup = mocker.spy(user_store, "get")
+
+    response = client.get('/pool-stats', headers={"Authorization": token})
+
+    assert (claims["role"], claims["ver"]) == ("admin", 0)
+    assert response.status_code != 403
+    assert lookup.call_count == 0
+
+def test_role_change_revokes_tokens(user_store, mock_db):
+    user_store.create("alice", generate_password_hash("secret"), "admin")
+    client = app.test_client()
+    old_token = client.post('/login', json={"username": "alice", "password": "secret"}).json["token"]
+
+    result = app.test_cli_runner().invoke(args=["set-role", "alice", "users"])
+    revoked = client.get('/pool-stats', headers={"Authorization": old_token})
+    new_token = client.post('/login', json={"username": "alice", "password": "secret"}).json["token"]
+    downgraded = client.get('/pool-stats', headers={"Authorization": new_token})
+
+    assert "alice is now users" in result.output
+    assert revoked.status_code == 401
+    assert b"revoked" in revoked.data
+    assert jwt.decode(new_token, app.config["SECRET_KEY"], algorithms=["HS256"])["ver"] == 1
+    assert downgraded.status_code == 403
+
+def test_revocation_list_reloads_periodically(user_store):
+    now = [0.0]
+    revocations = RevocationList(user_store, refresh=10, clock=lambda: now[0])
+    user_store.create("alice", "hash", "admin")
+    assert not revocations.is_revoked({"username": "alice", "ver": 0})
+
+    user_store.update("alice", role="users")
+    user_store.update("alice", role="users")
+    assert not revocations.is_revoked({"username": "alice", "ver": 0})
+    now[0] = 10
+
+    assert revocations.is_revoked({"username": "alice", "ver": 0})
+    assert not revocations.is_revoked({"username": "alice", "ver": 1})
+
+def test_login_issues_tokens_without_storing_them(user_store):
+    user_store.create("alice", generate_password_hash("secret"), "staff")
+    client = app.test_client()
+
+    first = client.post('/login', json={"username": "alice", "password": "secret"}).json
+    second = client.post('/login', json={"username": "alice", "password": "secret"}).json
+
+    assert first["expires_in"] == app.config["ACCESS_TOKEN_TTL"]
+    assert first["refresh_token"] != second["refresh_token"]
+    assert user_store.get("alice")["token"] is None
+
+def test_refresh_token_rotates(user_store):
+    user_store.create("alice", generate_password_hash("secret"), "staff")
+    client = app.test_client()
+    login = client.post('/login', json={"username": "alice", "password": "secret"}).json
+
+    refreshed = client.post('/token/refresh', json={"refresh_token": login["refresh_token"]})
+    claims = jwt.decode(refreshed.json["token"], app.config["SECRET_KEY"], algorithms=["HS256"])
+    again = client.post('/token/refresh', json={"refresh_token": refreshed.json["refresh_token"]})
+
+    assert refreshed.status_code == 200
+    assert (claims["username"], claims["role"]) == ("alice", "staff")
+    assert refreshed.json["refresh_token"] != login["refresh_token"]
+    assert again.status_code == 200
+
+def test_refresh_token_reuse_revokes_family(user_store):
+    user_store.create("alice", generate_password_hash("secret"), "staff")
+    client = app.test_client()
+    stolen = client.post('/login', json={"username": "alice", "password": "secret"}).json["refresh_token"]
+    current = client.post('/token/refresh', json={"refresh_token": stolen}).json["refresh_token"]
+
+    reused = client.post('/token/refresh', json={"refresh_token": stolen})
+    after_reuse = client.post('/token/refresh', json={"refresh_token": current})
+
+    assert reused.status_code == 401
+    assert after_reuse.status_code == 401
+    assert client.post('/token/refresh', json={}).status_code == 400
+
+def test_refresh_token_expires(user_store, monkeypatch):
+    user_store.create("alice", generate_password_hash("secret"), "staff")
+    monkeypatch.setitem(app.config, "REFRESH_TOKEN_TTL", -1)
+    client = app.test_client()
+    login = client.post('/login', json={"username": "alice", "password": "secret"}).json
+
+    response = client.post('/token/refresh', json={"refresh_token": login["refresh_token"]})
+
+    assert response.status_code == 401
+
+def test_revocation_list_forgets_expired_revocations(user_store):
+    user_store.create("alice", "hash", "admin")
+    user_store.update("alice", role="users")
+    user_store.update("alice", password="other")
+
+    assert user_store.revocations(0) == {"alice": 1}
+    assert RevocationList(user_store, window=3600).is_revoked({"username": "alice", "ver": 0})
+    assert user_store.revocations(user_store.get("alice")["revoked_at"]) == {}
+    assert not RevocationList(user_store, window=0).is_revoked({"username": "alice", "ver": 0})
+
+#Token cache test
+def test_token_cache_hit(mock_db, mocker):
+    mocker.patch.object(api, "token_cache", LRUCache(maxsize=8))
+    decode = mocker.spy(api.jwt, "decode")
+    mock_db.lastrowid = 1
+    headers = auth_headers()
+
+    client = app.test_client()
+    for _ in range(3):
+        response = client.post('/species', json={"species_name": "Rabbit"}, headers=headers)
+        assert response.status_code == 201
+
+    assert decode.call_count == 1
+    assert api.token_cache.stats()["hits"] == 2
+    assert api.token_cache.stats()["misses"] == 1
+
+def test_token_cache_rejects_invalid_token(mock_db):
+    client = app.test_client()
+    response = client.post('/species', json={"species_name": "Rabbit"}, headers={"Authorization": "garbage"})
+
+    assert response.status_code == 401
+    assert api.token_cache.get("garbage") is None
+
+def test_lru_cache_expiry_and_eviction():
+    now = [100.0]
+    cache = LRUCache(maxsize=2, clock=lambda: now[0])
+    cache.set("a", 1, expires_at=110)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    now[0] = 110
+    assert cache.get("a") is None
+    assert cache.get("c") == 3
+
+#Credential cache test
+def test_verify_password_cached(user_store, mocker):
+    mocker.patch.object(api, "credential_cache", LRUCache(maxsize=8, ttl=60))
+    user_store.create("kiosk", generate_password_hash("secret"), "users")
+    check = mocker.spy(api, "check_password_hash")
+
+    assert api.verify_password("kiosk", "secret") == "kiosk"
+    assert api.verify_password("kiosk", "secret") == "kiosk"
+    assert check.call_count == 1
+    assert api.verify_password("kiosk", "wrong") is None
+
+def test_verify_password_cache_invalidated_by_password_change(user_store, mocker):
+    mocker.patch.object(api, "credential_cache", LRUCache(maxsize=8, ttl=60))
+    user_store.create("kiosk", generate_password_hash("secret"), "users")
+    assert api.verify_password("kiosk", "secret") == "kiosk"
+
+    user_store.update("kiosk", password=generate_password_hash("changed"))
+
+    assert api.verify_password("kiosk", "secret") is None
+    assert api.verify_password("kiosk", "changed") == "kiosk"
+
+#Connection pool test
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self):
+        if not self.alive:
+            raise OSError("gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+def test_pool_reuses_connections():
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+
+    assert pool.acquire() is conn
+    assert conn.rollbacks == 1
+    assert pool.stats()["in_use"] == 1
+    assert pool.stats()["checkouts"] == 2
+
+def test_pool_checkout_timeout():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, timeout=0.01)
+    pool.acquire()
+
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+def test_pool_replaces_dead_connection():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, ping_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+
+    replacement = pool.acquire()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["recycled"] == 1
+
+def test_pool_fill_recovers_from_failed_connect():
+    attempts = []
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        return FakeConnection()
+    pool = ConnectionPool(connect, min_size=3, max_size=3, timeout=0.01)
+
+    with pytest.raises(OSError):
+        pool.acquire()
+    assert pool.stats()["size"] == 0
+
+    connections = [pool.acquire() for _ in range(3)]
+    assert len(set(map(id, connections))) == 3
+    assert pool.stats()["size"] == 3
+
+def test_pool_exhausted_returns_503(mocker):
+    mocker.patch.object(api.db.storage.pool, "acquire", side_effect=PoolTimeout("busy"))
+
+    client = app.test_client()
+    response = client.get('/species')
+
+    assert response.status_code == 503
+
+#Bulk insert test
+def test_post_medical_records_bulk(mock_db):
+    mock_db.lastrowid = 10
+
+    client = app.test_client()
+    response = client.post('/medical_records/bulk', headers=auth_headers(), json=[
+        {"pet_id": 1, "treatment_date": "2024-03-01", "treatment_details": "Rabies shot", "veterinarian": "Dr. Smith"},
+        {"pet_id": 2, "treatment_date": "2024-03-01", "treatment_details": "Rabies shot", "veterinarian": "Dr. Smith"}
+    ])
+
+    assert response.status_code == 201
+    assert [item["treatment_id"] for item in response.json["created"]] == [10, 11]
+    assert mock_db.executemany.call_count == 1
+    assert len(mock_db.executemany.call_args[0][1]) == 2
+
+def test_post_medical_records_bulk_atomic_rejects_invalid(mock_db):
+    client = app.test_client()
+    response = client.post('/medical_records/bulk', headers=auth_headers(), json=[
+        {"pet_id": 1, "treatment_date": "2024-03-01", "treatment_details": "Rabies shot", "veterinarian": "Dr. Smith"},
+        {"pet_id": 2, "treatment_date": "2024-03-01"}
+    ])
+
+    assert response.status_code == 400
+    assert response.json["errors"] == [{"index": 1, "error": "Treatment details are required and must be a string"}]
+    assert not mock_db.executemany.called
+
+def test_post_pets_bulk_partial(mock_db):
+    mock_db.lastrowid = 5
+
+    client = app.test_client()
+    response = client.post('/pets/bulk?mode=partial', headers=auth_headers(), json=[
+        {"name": "Rex", "species_id": 1, "date_arrived": "2024-03-01"},
+        {"species_id": 1, "date_arrived": "2024-03-01"},
+        {"name": "Tom", "species_id": 2, "date_arrived": "2024-03-01"}
+    ])
+
+    assert response.status_code == 207
+    assert response.json["data"] == [{"index": 0, "pet_id": 5}, {"index": 2, "pet_id": 6}]
+    assert response.json["errors"][0]["index"] == 1
+
+def test_post_pets_bulk_requires_array(mock_db):
+    client = app.test_client()
+    response = client.post('/pets/bulk', headers=auth_headers(), json={"name": "Rex"})
+
+    assert response.status_code == 400
+    assert b"non-empty array" in response.data
+
+#Species cache test
+def test_get_species_served_from_cache(mock_db):
+    mock_db.fetchall.return_value = [(1, 'Dog'), (2, 'Cat')]
+
+    client = app.test_client()
+    first = client.get('/species')
+    queries = mock_db.execute.call_count
+    second = client.get('/species')
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json == first.json
+    assert mock_db.execute.call_count == queries
+
+def test_species_cache_cleared_by_write(mock_db):
+    mock_db.fetchall.return_value = [(1, 'Dog')]
+    mock_db.lastrowid = 2
+
+    client = app.test_client()
+    client.get('/species')
+    client.post('/species', json={"species_name": "Cat"}, headers=auth_headers())
+    mock_db.fetchall.return_value = [(1, 'Dog'), (2, 'Cat')]
+    response = client.get('/species')
+
+    assert response.headers["X-Cache"] == "MISS"
+    assert b"Cat" in response.data
+
+#ETag test
+def test_get_pets_not_modified(mock_db):
+    mock_db.fetchone.return_value = (7,)
+    mock_db.fetchall.return_value = [
+        (1, "Max", 1, "Golden Retriever", 3, "Golden", "Male", False, "2023-01-01", None)
+    ]
+
+    client = app.test_client()
+    first = client.get('/pets')
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    mock_db.fetchall.reset_mock()
+    second = client.get('/pets', headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
+    assert not mock_db.fetchall.called
+
+def test_get_adoptions_etag_changes_with_version(mock_db):
+    mock_db.fetchone.return_value = (1,)
+    mock_db.fetchall.return_value = [
+        (1, 101, "John", "Doe", "123 Street", "john.doe@example.com", "1234567890", "2023-05-10", None)
+    ]
+
+    client = app.test_client()
+    etag = client.get('/adoptions').headers["ETag"]
+    mock_db.fetchone.return_value = (2,)
+    response = client.get('/adoptions', headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_write_bumps_table_version(mock_db):
+    mock_db.rowcount = 1
+
+    client = app.test_client()
+    client.post('/medical_records', headers=auth_headers(), json={
+        "pet_id": 101,
+        "treatment_date": "2023-05-10",
+        "treatment_details": "Vaccination",
+        "veterinarian": "Dr. Smith"
+    })
+
+    query, params = mock_db.execute.call_args[0]
+    assert query.startswith("UPDATE Table_Version")
+    assert params == ("Medical_Record",)
+
+def test_get_species_cached_not_modified(mock_db):
+    mock_db.fetchone.return_value = (3,)
+    mock_db.fetchall.return_value = [(1, 'Dog')]
+
+    client = app.test_client()
+    etag = client.get('/species').headers["ETag"]
+    response = client.get('/species', headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["X-Cache"] == "HIT"
+
+#SQLite storage test
+def test_sqlite_species_and_pets_roundtrip(sqlite_db):
+    client = app.test_client()
+    species = client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    species_id = species.json["data"]["species_id"]
+    for name in ("Max", "Bella", "Rex"):
+        response = client.post('/pets', headers=auth_headers(), json={
+            "name": name, "species_id": species_id, "breed_name": "Beagle", "age": 2,
+            "color": "Brown", "gender": "Male", "date_arrived": "2024-01-01"
+        })
+        assert response.status_code == 201
+
+    first = client.get('/pets?limit=2')
+    second = client.get('/pets?limit=2&next=' + first.json["next"])
+
+    assert [pet["name"] for pet in first.json["data"]] == ["Max", "Bella"]
+    assert [pet["name"] for pet in second.json["data"]] == ["Rex"]
+    assert second.json["next"] is None
+
+def test_sqlite_bulk_insert_returns_ids(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Cat"}, headers=auth_headers())
+    response = client.post('/pets/bulk', headers=auth_headers(), json=[
+        {"name": "Tom", "species_id": 1, "date_arrived": "2024-02-01"},
+        {"name": "Kitty", "species_id": 1, "date_arrived": "2024-02-02"}
+    ])
+
+    assert response.status_code == 201
+    ids = [item["pet_id"] for item in response.json["data"]]
+    names = [pet["name"] for pet in client.get('/pets').json["data"] if pet["pet_id"] in ids]
+    assert names == ["Tom", "Kitty"]
+
+def test_sqlite_bulk_partial_reports_foreign_key_errors(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Cat"}, headers=auth_headers())
+    response = client.post('/pets/bulk?mode=partial', headers=auth_headers(), json=[
+        {"name": "Tom", "species_id": 1, "date_arrived": "2024-02-01"},
+        {"name": "Ghost", "species_id": 99, "date_arrived": "2024-02-02"}
+    ])
+
+    assert response.status_code == 207
+    assert [item["index"] for item in response.json["data"]] == [0]
+    assert response.json["errors"][0]["index"] == 1
+
+def test_sqlite_filters_and_etag(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "gender": "Male", "date_arrived": "2024-01-03"})
+    client.post('/pets', headers=auth_headers(), json={"name": "Bella", "species_id": 1, "gender": "Female", "date_arrived": "2024-01-01"})
+
+    response = client.get('/pets?gender=Female&sort=-date_arrived')
+    assert [pet["name"] for pet in response.json["data"]] == ["Bella"]
+
+    etag = client.get('/pets').headers["ETag"]
+    assert client.get('/pets', headers={"If-None-Match": etag}).status_code == 304
+    client.post('/pets', headers=auth_headers(), json={"name": "Rex", "species_id": 1, "date_arrived": "2024-01-05"})
+    assert client.get('/pets', headers={"If-None-Match": etag}).status_code == 200
+
+def test_sqlite_stream(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/species', json={"species_name": "Cat"}, headers=auth_headers())
+
+    response = client.get('/species?stream=1')
+
+    assert [json.loads(line)["species_name"] for line in response.data.decode().splitlines()] == ["Dog", "Cat"]
+
+def test_sqlite_stream_pets_filtered_and_sorted(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/species', json={"species_name": "Cat"}, headers=auth_headers())
+    for name, species_id, arrived in (("Max", 1, "2024-01-03"), ("Tom", 2, "2024-01-01"), ("Rex", 1, "2024-01-02"), ("Bo", 1, "2024-01-04")):
+        client.post('/pets', headers=auth_headers(), json={"name": name, "species_id": species_id, "date_arrived": arrived})
+    client.post('/adoptions', headers=auth_headers(), json={"pet_id": 4, "first_name": "Jane", "last_name": "Doe", "adoption_date": "2024-02-01"})
+
+    response = client.get('/pets?stream=1&adopted=false&species_id=1&sort=-date_arrived')
+
+    assert [json.loads(line)["name"] for line in response.data.decode().splitlines()] == ["Max", "Rex"]
+    assert client.get('/pets?stream=1&species_id=dog').status_code == 400
+    assert client.get('/pets?stream=1&sort=name').status_code == 400
+
+#Benchmark test
+def test_benchmark_smoke(monkeypatch):
+    import benchmark
+    monkeypatch.setattr(api.db, "storage", api.db.storage)
+    monkeypatch.setattr(api, "users", api.users)
+
+    report = benchmark.run(pets=50, requests=40, mix={"list_pets": 3, "filter_pets": 1, "create_pet": 1})
+
+    assert sum(row["count"] for row in report["operations"].values()) == 40
+    assert all(row["errors"] == 0 for row in report["operations"].values())
+    assert report["operations"]["list_pets"]["p99_ms"] >= report["operations"]["list_pets"]["p50_ms"]
+
+#Pagination test
+def test_get_pets_next_cursor(mock_db):
+    mock_db.fetchall.return_value = [
+        (1, "Max", 1, "Golden Retriever", 3, "Golden", "Male", False, "2023-01-01", None),
+        (2, "Bella", 2, "Persian Cat", 2, "White", "Female", True, "2023-01-05", "2023-03-01")
+    ]
+
+    client = app.test_client()
+    response = client.get('/pets?limit=1')
+
+    assert response.status_code == 200
+    assert response.json["total"] == 1
+    assert response.json["next"]
+    assert response.headers["X-Next-Cursor"] == response.json["next"]
+    assert b"Bella" not in response.data
+
+def test_get_pets_follows_cursor(mock_db):
+    mock_db.fetchall.return_value = [
+        (2, "Bella", 2, "Persian Cat", 2, "White", "Female", True, "2023-01-05", "2023-03-01")
+    ]
+
+    client = app.test_client()
+    response = client.get('/pets?limit=1&next=' + encode_cursor({"after": 1}))
+
+    assert response.status_code == 200
+    assert response.json["next"] is None
+    assert mock_db.execute.call_args[0][1] == (1, 2)
+
+def test_get_adoptions_limit_capped(mock_db):
+    mock_db.fetchall.return_value = [
+        (1, 101, "John", "Doe", "123 Street", "john.doe@example.com", "1234567890", "2023-05-10", None)
+    ]
+
+    client = app.test_client()
+    response = client.get('/adoptions?limit=100000')
+
+    assert response.status_code == 200
+    assert mock_db.execute.call_args[0][1] == (0, app.config["PAGE_SIZE_MAX"] + 1)
+
+def test_get_medical_records_invalid_cursor(mock_db):
+    client = app.test_client()
+    response = client.get('/medical_records?next=not-a-cursor')
+
+    assert response.status_code == 400
+    assert b"Invalid pagination cursor" in response.data
+
+def test_get_species_invalid_limit(mock_db):
+    client = app.test_client()
+    response = client.get('/species?limit=0')
+
+    assert response.status_code == 400
+    assert b"limit must be at least 1" in response.data
+
+#Pet filter test
+def test_get_pets_filters(mock_db):
+    mock_db.fetchall.return_value = []
+
+    client = app.test_client()
+    response = client.get('/pets?adopted=false&species_id=1&gender=Male&arrived_from=2024-01-01')
+
+    assert response.status_code == 200
+    query, params = mock_db.execute.call_args[0]
+    assert "adopted = %s AND species_id = %s AND gender = %s AND date_arrived >= %s" in query
+    assert params == (False, 1, "Male", "2024-01-01", app.config["PAGE_SIZE_DEFAULT"] + 1)
+
+def test_get_pets_sort_by_date_desc(mock_db):
+    mock_db.fetchall.return_value = [
+        (2, "Bella", 2, "Persian Cat", 2, "White", "Female", True, "2023-01-05", "2023-03-01"),
+        (1, "Max", 1, "Golden Retriever", 3, "Golden", "Male", False, "2023-01-01", None)
+    ]
+
+    client = app.test_client()
+    response = client.get('/pets?sort=-date_arrived&limit=1')
+    assert "ORDER BY date_arrived DESC, pet_id DESC" in mock_db.execute.call_args[0][0]
+
+    response = client.get('/pets?sort=-date_arrived&limit=1&next=' + response.json["next"])
+    query, params = mock_db.execute.call_args[0]
+    assert "(date_arrived, pet_id) < (%s, %s)" in query
+    assert params == ("2023-01-05", 2, 2)
+
+def test_get_pets_invalid_filter(mock_db):
+    client = app.test_client()
+    response = client.get('/pets?arrived_to=yesterday')
+
+    assert response.status_code == 400
+    assert b"arrived_to must be a date" in response.data
+
+def test_get_pets_invalid_sort(mock_db):
+    client = app.test_client()
+    response = client.get('/pets?sort=address')
+
+    assert response.status_code == 400
+    assert b"sort must be one of" in response.data
+
+#Streaming test
+def test_get_pets_stream(mock_db, mocker):
+    mocker.patch.object(api.db, "stream_cursor", return_value=mock_db)
+    mock_db.fetchmany.side_effect = [
+        [(1, "Max", 1, "Golden Retriever", 3, "Golden", "Male", False, "2023-01-01", None)],
+        [(2, "Bella", 2, "Persian Cat", 2, "White", "Female", True, "2023-01-05", "2023-03-01")],
+        []
+    ]
+
+    client = app.test_client()
+    response = client.get('/pets?stream=1')
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.data.decode().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])["name"] == "Bella"
+    assert mock_db.close.called
+
+def test_get_medical_records_stream_accept_header(mock_db, mocker):
+    mocker.patch.object(api.db, "stream_cursor", return_value=mock_db)
+    mock_db.fetchmany.side_effect = [[(1, 101, "2023-05-10", "Vaccination", "Dr. Smith")], []]
+
+    client = app.test_client()
+    response = client.get('/medical_records', headers={"Accept": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert json.loads(response.data)["treatment_details"] == "Vaccination"
+
+#Metrics test
+def test_metrics_count_queries_per_request(sqlite_db, mocker):
+    recorded = []
+    mocker.patch.object(api.metrics.db_queries, "observe", side_effect=lambda labels, value: recorded.append((labels, value)))
+
+    client = app.test_client()
+    client.post('/pets', json={"name": "Max", "species_id": 1}, headers=auth_headers())
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.get('/adoptions')
+
+    assert recorded[-1] == (("/adoptions",), 2)
+
+def test_metrics_endpoint_prometheus_format(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.get('/species')
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.data.decode()
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_responses_total{endpoint="/species",method="GET",status="200"}' in text
+    assert 'db_queries_per_request_bucket{endpoint="/species",le="+Inf"}' in text
+    assert 'json_serialization_seconds_count{endpoint="/species"}' in text
+    assert 'db_pool_connections{state="idle"}' in text
+    assert 'cache_lookups_total{cache="species",result="miss"}' in text
+
+#Query monitor test
+def test_slow_query_log_includes_route_params_and_plan(sqlite_db, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, "QUERY_MONITOR_ENABLED", True)
+    monkeypatch.setitem(app.config, "SLOW_QUERY_THRESHOLD", 0)
+    monkeypatch.setitem(app.config, "SLOW_QUERY_EXPLAIN", True)
+
+    client = app.test_client()
+    with caplog.at_level("WARNING", logger="animal_shelter.queries"):
+        response = client.get('/pets?species_id=1')
+
+    assert response.status_code == 200
+    slow = [r.getMessage() for r in caplog.records if "FROM Pet" in r.getMessage()]
+    assert slow and "GET /pets" in slow[0]
+    assert "params (int, int)" in slow[0]
+    assert "plan:" in slow[0]
+
+def test_query_budget_fails_in_test_mode(sqlite_db, monkeypatch):
+    monkeypatch.setitem(app.config, "QUERY_MONITOR_ENABLED", True)
+    monkeypatch.setitem(app.config, "QUERY_BUDGET_DEFAULT", 1)
+    monkeypatch.setattr(app, "testing", True)
+
+    client = app.test_client()
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/adoptions')
+
+def test_query_budget_only_logged_outside_test_mode(sqlite_db, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, "QUERY_MONITOR_ENABLED", True)
+    monkeypatch.setitem(app.config, "QUERY_BUDGET_DEFAULT", 1)
+
+    client = app.test_client()
+    with caplog.at_level("WARNING", logger="animal_shelter.queries"):
+        response = client.get('/pets')
+
+    assert response.status_code == 200
+    assert "over its budget of 1" in caplog.text
+
+def test_describe_params_hides_values():
+    assert describe_params((1, "secret")) == "(int, str)"
+    assert describe_params([("a", 1), ("b", 2)]) == "2 x (str, int)"
+    assert describe_params(None) == "()"
+
+#Pet profile test
+def test_pet_profile_aggregates_related_rows(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={
+        "name": "Max", "species_id": 1, "breed_name": "Beagle", "date_arrived": "2024-01-01"
+    })
+    client.post('/medical_records', headers=auth_headers(), json={
+        "pet_id": 1, "treatment_date": "2024-02-01", "treatment_details": "Vaccination", "veterinarian": "Dr. Smith"
+    })
+    client.post('/adoptions', headers=auth_headers(), json={
+        "pet_id": 1, "first_name": "Jane", "last_name": "Doe", "adoption_date": "2024-03-01"
+    })
+
+    response = client.get('/pets/1/profile')
+
+    assert response.status_code == 200
+    profile = response.json["data"]
+    assert profile["name"] == "Max"
+    assert profile["species_name"] == "Dog"
+    assert [record["treatment_details"] for record in profile["medical_records"]] == ["Vaccination"]
+    assert [adoption["first_name"] for adoption in profile["adoptions"]] == ["Jane"]
+
+def test_pet_profile_etag_tracks_related_tables(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+
+    etag = client.get('/pets/1/profile').headers["ETag"]
+    assert client.get('/pets/1/profile', headers={"If-None-Match": etag}).status_code == 304
+
+    client.post('/medical_records', headers=auth_headers(), json={
+        "pet_id": 1, "treatment_date": "2024-02-01", "treatment_details": "Check-up", "veterinarian": "Dr. Smith"
+    })
+    assert client.get('/pets/1/profile', headers={"If-None-Match": etag}).status_code == 200
+
+def test_pet_profile_not_found(sqlite_db):
+    client = app.test_client()
+    response = client.get('/pets/99/profile')
+    assert response.status_code == 404
+
+#Stats test
+def test_stats_follow_writes(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers(role="admin"))
+    client.post('/species', json={"species_name": "Cat"}, headers=auth_headers(role="admin"))
+    for species_id in (1, 1, 2):
+        client.post('/pets', headers=auth_headers(role="admin"), json={"name": "Max", "species_id": species_id, "date_arrived": "2024-01-01"})
+    client.post('/pets/bulk', headers=auth_headers(role="admin"), json=[{"name": "Tom", "species_id": 2, "date_arrived": "2024-01-02"}])
+    client.post('/adoptions', headers=auth_headers(role="admin"), json={
+        "pet_id": 1, "first_name": "Jane", "last_name": "Doe", "adoption_date": "2024-03-01"
+    })
+    client.put('/pets/2', headers=auth_headers(role="admin"), json={"name": "Max", "species_id": 2})
+    client.delete('/pets/3', headers=auth_headers(role="admin"))
+
+    response = client.get('/stats')
+
+    assert response.status_code == 200
+    stats = response.json["data"]
+    assert (stats["pets"], stats["occupancy"], stats["adoptions"]) == (3, 2, 1)
+    assert [(s["species_name"], s["pets"], s["adoptions"]) for s in stats["species"]] == [("Dog", 1, 1), ("Cat", 2, 0)]
+
+def test_rebuild_stats_recomputes_summary(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    client.post('/pets', headers=auth_headers(), json={"name": "Rex", "species_id": 1, "date_arrived": "2024-01-01"})
+    conn = sqlite_db.acquire()
+    conn.cursor().execute("UPDATE Pet SET adopted = 1, date_adopted = '2024-01-11' WHERE pet_id = 1")
+    conn.cursor().execute("UPDATE Species_Stats SET pets = 99")
+    conn.commit()
+    sqlite_db.release(conn)
+
+    result = app.test_cli_runner().invoke(args=["rebuild-stats"])
+    stats = client.get('/stats').json["data"]
+
+    assert "1 species" in result.output
+    assert (stats["pets"], stats["occupancy"], stats["average_stay_days"]) == (2, 1, 10.0)
+
+def test_rebuild_stats_keeps_concurrent_writes(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "shelter.db"))
+    storage.create_schema()
+    monkeypatch.setattr(api.db, "storage", storage)
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+
+    # Another worker adds a pet while the rebuild is scanning
+    writer = threading.Thread(target=lambda: client.post(
+        '/pets', headers=auth_headers(), json={"name": "Rex", "species_id": 1, "date_arrived": "2024-01-02"}
+    ))
+    contribution = api.pet_contribution
+    def scan_row(row):
+        if writer.ident is None:
+            writer.start()
+            writer.join(0.5)
+        return contribution(row)
+    monkeypatch.setattr(api, "pet_contribution", scan_row)
+
+    with app.app_context():
+        api.rebuild_stats()
+    writer.join()
+
+    assert client.get('/stats').json["data"]["pets"] == 2
+
+#Search test
+def test_search_pets_by_name_and_breed(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    for name, breed in (("Max", "Labrador"), ("Max", "Beagle"), ("Maxine", "Labrador Retriever"), ("Bella", "Labrador")):
+        client.post('/pets', headers=auth_headers(), json={
+            "name": name, "species_id": 1, "breed_name": breed, "date_arrived": "2024-01-01"
+        })
+
+    response = client.get('/search?q=max+labrador')
+
+    assert response.status_code == 200
+    assert sorted(pet["pet_id"] for pet in response.json["data"]) == [1, 3]
+    assert all("score" in pet for pet in response.json["data"])
+
+def test_search_medical_records_ranked_and_paged(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    for details in ("Parvo test negative", "Parvo parvo booster", "Dental cleaning", "Parvo vaccination"):
+        client.post('/medical_records', headers=auth_headers(), json={
+            "pet_id": 1, "treatment_date": "2024-02-01", "treatment_details": details, "veterinarian": "Dr. Smith"
+        })
+
+    first = client.get('/search?type=medical_records&q=parvo&limit=2')
+    second = client.get('/search?type=medical_records&q=parvo&limit=2&next=' + first.json["next"])
+
+    assert first.json["data"][0]["treatment_details"] == "Parvo parvo booster"
+    ids = [r["treatment_id"] for r in first.json["data"] + second.json["data"]]
+    assert sorted(ids) == [1, 2, 4]
+    assert second.json["next"] is None
+
+def test_search_index_follows_updates_and_deletes(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers(role="admin"))
+    client.post('/pets', headers=auth_headers(role="admin"), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    client.post('/pets', headers=auth_headers(role="admin"), json={"name": "Rex", "species_id": 1, "date_arrived": "2024-01-01"})
+
+    client.put('/pets/1', headers=auth_headers(role="admin"), json={"name": "Buddy", "species_id": 1})
+    client.delete('/pets/2', headers=auth_headers(role="admin"))
+
+    assert client.get('/search?q=max').json["data"] == []
+    assert client.get('/search?q=rex').json["data"] == []
+    assert [pet["pet_id"] for pet in client.get('/search?q=bud').json["data"]] == [1]
+
+def test_search_requires_query(sqlite_db):
+    client = app.test_client()
+    assert client.get('/search?q=%20').status_code == 400
+    assert client.get('/search?q=max&type=owners').status_code == 400
+
+#Sparse fieldset test
+def test_pets_fields_selects_only_requested_columns(sqlite_db, mocker):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    for name, arrived in (("Max", "2024-01-02"), ("Bella", "2024-01-01")):
+        client.post('/pets', headers=auth_headers(), json={"name": name, "species_id": 1, "date_arrived": arrived})
+    spy = mocker.spy(api, "fetch_all")
+
+    first = client.get('/pets?fields=name&sort=date_arrived&limit=1')
+    second = client.get('/pets?fields=name&sort=date_arrived&limit=1&next=' + first.json["next"])
+
+    assert spy.call_args_list[0][0][0].startswith("SELECT pet_id, name, date_arrived FROM Pet")
+    assert first.json["data"] == [{"name": "Bella"}]
+    assert second.json["data"] == [{"name": "Max"}]
+
+def test_medical_records_fields(mock_db):
+    mock_db.fetchone.return_value = (1,)
+    mock_db.fetchall.return_value = [(1, "Dr. Smith")]
+
+    client = app.test_client()
+    response = client.get('/medical_records?fields=veterinarian')
+
+    assert response.status_code == 200
+    assert response.json == [{"veterinarian": "Dr. Smith"}]
+    assert mock_db.execute.call_args[0][0].startswith("SELECT treatment_id, veterinarian FROM Medical_Record")
+
+def test_fields_rejects_unknown_column(mock_db):
+    client = app.test_client()
+    response = client.get('/adoptions?fields=first_name,password')
+    assert response.status_code == 400
+
+def test_pet_profile_fields_skip_unrequested_parts(sqlite_db, mocker):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    spy = mocker.spy(api, "fetch_all")
+
+    response = client.get('/pets/1/profile?fields=name,species_name')
+
+    assert response.json["data"] == {"name": "Max", "species_name": "Dog"}
+    assert not spy.called
+
+#JSON provider and compression test
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_provider_dates_and_decimals(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(fastjson, "orjson", None)
+    value = {"date_arrived": datetime.date(2024, 1, 2), "total": decimal.Decimal("1.50")}
+
+    with app.app_context():
+        encoded = json.loads(app.json.dumps(value))
+
+    assert encoded == {"date_arrived": "2024-01-02", "total": "1.50"}
+
+def test_large_response_gzipped_when_accepted(mock_db):
+    mock_db.fetchone.return_value = (1,)
+    mock_db.fetchall.return_value = [
+        (i, 101, "2023-05-10", "Vaccination and general check-up", "Dr. Smith") for i in range(1, 51)
+    ]
+
+    client = app.test_client()
+    plain = client.get('/medical_records')
+    compressed = client.get('/medical_records', headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert json.loads(gzip.decompress(compressed.data)) == plain.json
+
+def test_compressed_response_has_own_etag(mock_db):
+    mock_db.fetchone.return_value = (1,)
+    mock_db.fetchall.return_value = [
+        (i, 101, "2023-05-10", "Vaccination and general check-up", "Dr. Smith") for i in range(1, 51)
+    ]
+
+    client = app.test_client()
+    plain = client.get('/medical_records')
+    compressed = client.get('/medical_records', headers={"Accept-Encoding": "gzip"})
+    revalidated = client.get('/medical_records', headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["ETag"]})
+
+    assert compressed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == compressed.headers["ETag"]
+
+def test_small_response_not_compressed(mock_db):
+    mock_db.fetchone.return_value = (1,)
+    mock_db.fetchall.return_value = [(1, 'Dog')]
+
+    client = app.test_client()
+    response = client.get('/species', headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+
+#Change feed test
+def test_change_feed_returns_delta_in_order(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers(role="admin"))
+    client.post('/pets', headers=auth_headers(role="admin"), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    checkpoint = client.get('/changes').json["next"]
+
+    client.put('/pets/1', headers=auth_headers(role="admin"), json={"name": "Buddy", "species_id": 1})
+    client.post('/medical_records', headers=auth_headers(role="admin"), json={
+        "pet_id": 1, "treatment_date": "2024-02-01", "treatment_details": "Check-up", "veterinarian": "Dr. Smith"
+    })
+    client.delete('/species/1', headers=auth_headers(role="admin"))
+
+    response = client.get('/changes?since=' + checkpoint)
+    changes = [(c["table"], c["id"], c["operation"]) for c in response.json["data"]]
+
+    assert changes == [
+        ("Pet", 1, "update"), ("Medical_Record", 1, "insert"),
+        ("Medical_Record", 1, "delete"), ("Pet", 1, "delete"), ("Species", 1, "delete"),
+    ]
+    assert response.json["data"][1]["data"] is None
+    assert client.get('/changes?since=' + response.json["next"]).json["data"] == []
+
+def test_change_feed_pages_and_carries_rows(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets/bulk', headers=auth_headers(), json=[
+        {"name": name, "species_id": 1, "date_arrived": "2024-01-01"} for name in ("Max", "Bella")
+    ])
+
+    first = client.get('/changes?limit=2')
+    second = client.get('/changes?limit=2&since=' + first.json["next"])
+
+    assert first.json["has_more"] is True
+    assert first.json["data"][1]["data"]["name"] == "Max"
+    assert [c["data"]["name"] for c in second.json["data"]] == ["Bella"]
+    assert second.json["has_more"] is False
+    etag = second.headers["ETag"]
+    assert client.get('/changes?limit=2&since=' + first.json["next"], headers={"If-None-Match": etag}).status_code == 304
+
+def test_writes_take_change_log_counter_first(sqlite_db, monkeypatch):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+    statements = []
+    monkeypatch.setattr(api.db, "query_hooks", api.db.query_hooks + [lambda query, params, elapsed: statements.append((query, params))])
+
+    writes = [
+        lambda: client.post('/pets', headers=auth_headers(), json={"name": "Rex", "species_id": 1, "date_arrived": "2024-01-01"}),
+        lambda: client.post('/adoptions', headers=auth_headers(), json={"pet_id": 1, "first_name": "Jane", "last_name": "Doe", "adoption_date": "2024-02-01"}),
+        lambda: client.post('/pets/bulk', headers=auth_headers(), json=[{"name": "Tom", "species_id": 1, "date_arrived": "2024-01-02"}]),
+        lambda: client.delete('/pets/2', headers=auth_headers(role="admin")),
+    ]
+    for write in writes:
+        statements.clear()
+        assert write().status_code < 300
+        assert statements[0][0].startswith("UPDATE Table_Version") and statements[0][1] == ("Change_Log",)
+
+#Server-sent events test
+def read_event(stream):
+    while True:
+        chunk = next(stream).decode()
+        if chunk.startswith("id:"):
+            return dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+
+def test_events_pushes_new_changes(sqlite_db):
+    client = app.test_client()
+    response = client.get('/events', buffered=False)
+    stream = iter(response.response)
+    assert next(stream) == b"retry: 3000\n\n"
+
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/pets', headers=auth_headers(), json={"name": "Max", "species_id": 1, "date_arrived": "2024-01-01"})
+
+    first, second = read_event(stream), read_event(stream)
+    response.close()
+
+    assert response.mimetype == "text/event-stream"
+    assert first["event"] == "Species.insert"
+    assert second["event"] == "Pet.insert"
+    assert json.loads(second["data"])["data"]["name"] == "Max"
+
+def test_events_replays_after_last_event_id(sqlite_db):
+    client = app.test_client()
+    client.post('/species', json={"species_name": "Dog"}, headers=auth_headers())
+    client.post('/species', json={"species_name": "Cat"}, headers=auth_headers())
+    first_id = client.get('/changes').json["data"][0]["change_id"]
+
+    response = client.get('/events', headers={"Last-Event-ID": str(first_id)}, buffered=False)
+    event = read_event(iter(response.response))
+    response.close()
+
+    assert json.loads(event["data"])["data"]["species_name"] == "Cat"
+
+def test_event_hub_drops_slow_subscriber():
+    pages = [[{"change_id": 1}, {"change_id": 2}], []]
+    hub = EventHub(LocalBroker(), lambda after: pages.pop(0), lambda: 0, poll_interval=3600, queue_size=1)
+    slow = hub.subscribe()
+
+    hub.dispatch()
+
+    assert slow.get_nowait() is None
+    assert hub.last_id == 2
+    assert slow not in hub._subscribers
+
+#Batch test
+def test_batch_references_earlier_results(sqlite_db):
+    client = app.test_client()
+    response = client.post('/batch', headers=auth_headers(), json={"requests": [
+        {"method": "POST", "path": "/species", "body": {"species_name": "Dog"}},
+        {"method": "POST", "path": "/pets", "body": {"name": "Max", "species_id": "$0.data.species_id", "date_arrived": "2024-01-01"}},
+        {"method": "GET", "path": "/pets/$1.data.pet_id/profile"},
+    ]})
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json["results"]] == [201, 201, 200]
+    assert response.json["results"][2]["body"]["data"]["name"] == "Max"
+
+def test_batch_reports_failed_items(sqlite_db):
+    client = app.test_client()
+    response = client.post('/batch', headers=auth_headers(), json={"requests": [
+        {"method": "GET", "path": "/pets/99/profile"},
+        {"method": "GET", "path": "/pets/$0.data.pet_id/profile"},
+        {"method": "GET", "path": "/nowhere"},
+        {"method": "POST", "path": "/species", "body": {"species_name": "Dog"}},
+    ]})
+
+    assert response.status_code == 207
+    assert [result["status"] for result in response.json["results"]] == [404, 424, 404, 201]
+
+def test_batch_atomic_rolls_back(sqlite_db):
+    client = app.test_client()
+    response = client.post('/batch', headers=auth_headers(), json={"atomic": True, "requests": [
+        {"method": "POST", "path": "/species", "body": {"species_name": "Dog"}},
+        {"method": "POST", "path": "/pets", "body": {"name": "Max"}},
+        {"method": "POST", "path": "/species", "body": {"species_name": "Cat"}},
+    ]})
+
+    assert response.status_code == 400
+    assert response.json["rolled_back"] is True
+    assert [result["status"] for result in response.json["results"]] == [201, 500]
+    assert client.get('/species').status_code == 404
+
+def test_batch_authenticates_once(sqlite_db):
+    client = app.test_client()
+    response = client.post('/batch', headers=auth_headers(role="user"), json={"requests": [
+        {"method": "POST", "path": "/species", "body": {"species_name": "Dog"}},
+        {"method": "DELETE", "path": "/species/1"},
+    ]})
+
+    assert [result["status"] for result in response.json["results"]] == [201, 403]
+    assert client.post('/batch', json={"requests": [{"path": "/species"}]}).status_code == 401
+
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
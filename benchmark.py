@@ -0,0 +1,288 @@
+"""Load test and benchmark for the Animal Shelter API.
+
+Boots ``app`` against a local SQLite database seeded with ``--pets`` pets,
+replays a weighted mix of API calls and reports throughput and p50/p95/p99
+latency per operation. Requests go through Flask's test client, or through a
+local WSGI server over HTTP with ``--server``.
+
+    python benchmark.py --pets 1000
+    python benchmark.py --pets 100000 --requests 20000 --mix list_pets=5,create_pet=1
+    python benchmark.py --pets 1000000 --server --concurrency 4 --json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import api
+from storage import SQLiteStorage
+from userstore import UserStore
+
+DEFAULT_MIX = {
+    "register": 1,
+    "login": 2,
+    "list_species": 10,
+    "list_pets": 20,
+    "filter_pets": 15,
+    "list_adoptions": 8,
+    "list_medical_records": 8,
+    "create_pet": 8,
+    "update_pet": 5,
+    "delete_pet": 2,
+    "add_medical_record": 5,
+    "update_medical_record": 3,
+}
+
+SEED_CHUNK = 10000
+SPECIES = ["Dog", "Cat", "Rabbit", "Hamster", "Parrot", "Turtle", "Ferret", "Guinea Pig"]
+NAMES = ["Max", "Bella", "Charlie", "Luna", "Rocky", "Daisy", "Milo", "Coco", "Buddy", "Nala"]
+GENDERS = ["Male", "Female"]
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def seed(storage, pets, rng):
+    """Fill the database with ``pets`` pets plus adoptions and medical records for some of them."""
+    conn = storage.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO Species (species_name) VALUES (%s)", [(name,) for name in SPECIES])
+        for start in range(0, pets, SEED_CHUNK):
+            count = min(SEED_CHUNK, pets - start)
+            cursor.executemany(api.PET_INSERT, [(
+                rng.choice(NAMES), rng.randint(1, len(SPECIES)), "Mixed", rng.randint(0, 15),
+                "Brown", rng.choice(GENDERS), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            ) for _ in range(count)])
+            cursor.executemany(api.MEDICAL_RECORD_INSERT, [
+                (pet_id, "2024-06-01", "Routine check-up and vaccination", "Dr. Smith")
+                for pet_id in range(start + 1, start + count + 1, 2)
+            ])
+            cursor.executemany(
+                "INSERT INTO Adoption (pet_id, first_name, last_name, adoption_date) VALUES (%s, %s, %s, %s)",
+                [(pet_id, "Jane", "Doe", "2024-07-01") for pet_id in range(start + 1, start + count + 1, 10)],
+            )
+        conn.commit()
+    finally:
+        storage.release(conn)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        response.close()
+        return response.status_code
+
+
+class HTTPClient:
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port)
+
+    def send(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        self.conn.request(method, path, body=payload, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+
+class Workload:
+    """The operations of the mix. Each returns (method, path, body, headers)."""
+
+    def __init__(self, pets, token, rng):
+        self.pets = pets
+        self.auth = {"Authorization": token}
+        self.rng = rng
+        self.users = 0
+        self.lock = threading.Lock()
+
+    def pet_id(self):
+        return self.rng.randint(1, self.pets)
+
+    def register(self):
+        with self.lock:
+            self.users += 1
+            username = f"bench-user-{os.getpid()}-{self.users}"
+        return "POST", "/register", {"username": username, "password": "secret"}, None
+
+    def login(self):
+        return "POST", "/login", {"username": "bench-admin", "password": "secret"}, None
+
+    def list_species(self):
+        return "GET", "/species", None, None
+
+    def list_pets(self):
+        return "GET", "/pets?limit=50", None, None
+
+    def filter_pets(self):
+        species_id = self.rng.randint(1, len(SPECIES))
+        return "GET", f"/pets?adopted=false&species_id={species_id}&sort=-date_arrived&limit=50", None, None
+
+    def list_adoptions(self):
+        return "GET", "/adoptions?limit=50", None, None
+
+    def list_medical_records(self):
+        return "GET", "/medical_records?limit=50", None, None
+
+    def create_pet(self):
+        body = {"name": self.rng.choice(NAMES), "species_id": self.rng.randint(1, len(SPECIES)), "breed_name": "Mixed",
+                "age": 2, "color": "Black", "gender": self.rng.choice(GENDERS), "date_arrived": "2025-01-15"}
+        return "POST", "/pets", body, self.auth
+
+    def update_pet(self):
+        body = {"name": "Renamed", "species_id": 1, "breed_name": "Mixed", "age": 3, "color": "Black", "gender": "Male"}
+        return "PUT", f"/pets/{self.pet_id()}", body, self.auth
+
+    def delete_pet(self):
+        return "DELETE", f"/pets/{self.pet_id()}", None, self.auth
+
+    def add_medical_record(self):
+        body = {"pet_id": self.pet_id(), "treatment_date": "2025-01-20",
+                "treatment_details": "Deworming", "veterinarian": "Dr. Adams"}
+        return "POST", "/medical_records", body, self.auth
+
+    def update_medical_record(self):
+        body = {"treatment_date": "2025-01-21", "treatment_details": "Follow-up", "veterinarian": "Dr. Adams"}
+        return "PUT", f"/medical_records/{self.rng.randint(1, max(self.pets // 2, 1))}", body, self.auth
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run(pets=1000, requests=2000, mix=None, server=False, concurrency=1, database=":memory:", seed_value=0):
+    """Seed the database, replay the mix and return per-operation results."""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed_value)
+
+    work_dir = tempfile.mkdtemp(prefix="shelter-bench-")
+    if database == ":memory:" and concurrency > 1:
+        # Shared-cache in-memory databases fail concurrent writers immediately
+        # instead of waiting, so concurrent runs use a scratch file (WAL) instead
+        database = os.path.join(work_dir, "shelter.db")
+    storage = SQLiteStorage(database, max_size=max(concurrency, 1) + 1)
+    storage.create_schema()
+    seed(storage, pets, rng)
+    api.db.storage = storage
+    api.species_cache.clear()
+
+    api.users = UserStore(os.path.join(work_dir, "users.db"))
+    api.users.create("bench-admin", generate_password_hash("secret"), "admin")
+
+    httpd = None
+    if server:
+        httpd = make_server("127.0.0.1", 0, api.app, threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        new_client = lambda: HTTPClient("127.0.0.1", httpd.server_port)
+    else:
+        new_client = lambda: InProcessClient(api.app)
+
+    token_client = new_client()
+    token = api.app.test_client().post("/login", json={"username": "bench-admin", "password": "secret"}).json["token"]
+    workload = Workload(pets, token, rng)
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+    plan = rng.choices(operations, weights=weights, k=requests)
+
+    latencies = {name: [] for name in operations}
+    errors = {name: 0 for name in operations}
+    record_lock = threading.Lock()
+
+    def worker(items):
+        client = token_client if concurrency == 1 else new_client()
+        for name in items:
+            method, path, body, headers = getattr(workload, name)()
+            start = time.perf_counter()
+            status = client.send(method, path, body, headers)
+            elapsed = time.perf_counter() - start
+            with record_lock:
+                latencies[name].append(elapsed)
+                if status >= 500:
+                    errors[name] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(plan[i::concurrency],)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    if httpd:
+        httpd.shutdown()
+
+    results = {}
+    for name in operations:
+        values = sorted(latencies[name])
+        results[name] = {
+            "count": len(values),
+            "throughput": len(values) / wall_time if wall_time else 0.0,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "errors": errors[name],
+        }
+    return {"pets": pets, "requests": requests, "wall_time": wall_time,
+            "throughput": requests / wall_time if wall_time else 0.0, "operations": results}
+
+
+def print_report(report):
+    print(f"pets={report['pets']} requests={report['requests']} "
+          f"wall={report['wall_time']:.2f}s throughput={report['throughput']:.1f} req/s")
+    print(f"{'operation':<24}{'count':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'5xx':>6}")
+    for name, row in report["operations"].items():
+        print(f"{name:<24}{row['count']:>8}{row['throughput']:>10.1f}{row['p50_ms']:>10.2f}"
+              f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pets", type=int, default=1000, help="number of pets to seed (e.g. 1000, 100000, 1000000)")
+    parser.add_argument("--requests", type=int, default=2000, help="number of requests to replay")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="weighted operations, e.g. list_pets=5,create_pet=1 (default: a read-heavy mix)")
+    parser.add_argument("--server", action="store_true", help="send requests over HTTP to a local WSGI server")
+    parser.add_argument("--concurrency", type=int, default=1, help="number of client threads")
+    parser.add_argument("--database", default=":memory:", help="SQLite file to use instead of an in-memory database")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for data and request order")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.pets, args.requests, args.mix, args.server, args.concurrency, args.database, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
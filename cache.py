@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache whose entries can also expire.
+
+    An entry expires at the absolute time passed to ``set`` or, failing that,
+    ``ttl`` seconds after it was stored. Hits and misses are counted so the
+    cache's effectiveness can be checked at runtime.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, expires_at=None):
+        if expires_at is None and self.ttl is not None:
+            expires_at = self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+class RedisCache:
+    """LRUCache-compatible cache kept in Redis, shared by every worker process.
+
+    Keys live under a generation number, so ``clear`` invalidates all of them
+    with a single INCR; the orphaned keys then age out through their TTL.
+    Values must be JSON-serializable. Size is bounded by Redis' own maxmemory
+    policy.
+    """
+
+    def __init__(self, client, prefix, ttl=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key):
+        generation = int(self.client.get(f"{self.prefix}:generation") or 0)
+        return f"{self.prefix}:{generation}:{key}"
+
+    def get(self, key, default=None):
+        value = self.client.get(self._key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value, expires_at=None):
+        ttl = self.ttl if expires_at is None else max(int(expires_at - time.time()), 1)
+        self.client.set(self._key(key), json.dumps(value), ex=ttl)
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.client.delete(self._key(key))
+        return value
+
+    def clear(self):
+        self.client.incr(f"{self.prefix}:generation")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "backend": "redis"}
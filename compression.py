@@ -0,0 +1,79 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+ENCODINGS = ("br", "gzip")
+
+
+# A compressed body is a different representation, so it gets its own strong ETag:
+# the identity one with the encoding appended
+def identity_etag(etag):
+    """``etag`` without the encoding suffix Compression may have added to it."""
+    for encoding in ENCODINGS:
+        if etag.endswith("-" + encoding):
+            return etag[:-len(encoding) - 1]
+    return etag
+
+
+def matching_etag(etag):
+    """The tag in the request's If-None-Match that names ``etag`` in any encoding, or None."""
+    if request.if_none_match.star_tag:
+        return etag
+    for tag in request.if_none_match.as_set():
+        if identity_etag(tag) == etag:
+            return tag
+    return None
+
+
+class Compression:
+    """Compress responses with brotli or gzip, as negotiated through Accept-Encoding.
+
+    Only complete (non-streamed) responses of ``COMPRESS_MIMETYPES`` that are
+    at least ``COMPRESS_MIN_SIZE`` bytes are compressed; smaller bodies gain
+    too little to be worth the CPU time.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+        app.config.setdefault("COMPRESS_MIMETYPES", ["application/json", "text/plain", "text/html"])
+        app.config.setdefault("COMPRESS_GZIP_LEVEL", 6)
+        app.config.setdefault("COMPRESS_BROTLI_QUALITY", 4)
+        app.after_request(self._after_request)
+
+    def choose_encoding(self):
+        offered = list(ENCODINGS) if brotli is not None else ["gzip"]
+        return request.accept_encodings.best_match(offered)
+
+    def _after_request(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.is_streamed or response.direct_passthrough
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in self.app.config["COMPRESS_MIMETYPES"]):
+            return response
+        response.vary.add("Accept-Encoding")
+        if response.content_length is None or response.content_length < self.app.config["COMPRESS_MIN_SIZE"]:
+            return response
+
+        encoding = self.choose_encoding()
+        if encoding == "br":
+            body = brotli.compress(response.get_data(), quality=self.app.config["COMPRESS_BROTLI_QUALITY"])
+        elif encoding == "gzip":
+            body = gzip.compress(response.get_data(), compresslevel=self.app.config["COMPRESS_GZIP_LEVEL"], mtime=0)
+        else:
+            return response
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
@@ -0,0 +1,133 @@
+import queue
+import threading
+
+
+class LocalBroker:
+    """In-process stand-in for RedisBroker: a publish wakes the dispatcher of this process only."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._published = 0
+        self._seen = 0
+
+    def publish(self):
+        with self._cond:
+            self._published += 1
+            self._cond.notify_all()
+
+    # Block until something is published or `timeout` seconds pass; True if something was
+    def wait(self, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._published != self._seen, timeout)
+            woken = self._published != self._seen
+            self._seen = self._published
+            return woken
+
+
+class RedisBroker:
+    """Redis pub/sub broker, so a write in any worker process wakes the dispatchers of all of them."""
+
+    def __init__(self, client, channel="animal_shelter:events"):
+        self.client = client
+        self.channel = channel
+        self._pubsub = None
+
+    def publish(self):
+        self.client.publish(self.channel, "1")
+
+    def wait(self, timeout):
+        if self._pubsub is None:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(self.channel)
+        woken = self._pubsub.get_message(timeout=timeout) is not None
+        # A burst of writes needs only one load
+        while woken and self._pubsub.get_message(timeout=0) is not None:
+            pass
+        return woken
+
+
+class EventHub:
+    """Fans new change-log events out to the subscribers in this process.
+
+    One dispatcher thread per process waits on the broker and reads what is
+    new with ``load(after)``, which returns up to a page of events (dicts
+    with a ``change_id``) after that ID; so each burst of writes costs one
+    query however many clients listen. The dispatcher also checks every
+    ``poll_interval`` seconds, in case a wake-up was lost. ``latest()``
+    returns the newest change ID, where dispatch starts.
+
+    Each subscriber gets a bounded queue. One that falls ``queue_size``
+    events behind is sent None and dropped; it reconnects and catches up
+    from the change log.
+    """
+
+    def __init__(self, broker, load, latest, poll_interval=5.0, queue_size=1000):
+        self.broker = broker
+        self.load = load
+        self.latest = latest
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.last_id = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def publish(self):
+        self.broker.publish()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if not self._subscribers:
+                # Nobody was listening, so nothing since the last dispatch is owed to anyone
+                self.last_id = self.latest()
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-dispatcher", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _run(self):
+        while True:
+            self.broker.wait(self.poll_interval)
+            try:
+                self.dispatch()
+            except Exception:
+                pass  # e.g. the database is briefly unavailable; retry on the next wake-up
+
+    def dispatch(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    return
+                after = self.last_id
+            events = self.load(after)
+            if not events:
+                return
+            with self._lock:
+                if self.last_id != after:
+                    continue  # a first subscriber reset the position meanwhile
+                self.last_id = events[-1]["change_id"]
+                for subscriber in list(self._subscribers):
+                    try:
+                        for event in events:
+                            subscriber.put_nowait(event)
+                    except queue.Full:
+                        self._subscribers.discard(subscriber)
+                        self._drop(subscriber)
+
+    @staticmethod
+    def _drop(subscriber):
+        while True:
+            try:
+                subscriber.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
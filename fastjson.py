@@ -0,0 +1,62 @@
+import datetime
+import decimal
+import json
+
+from flask.json.provider import DefaultJSONProvider, _default as flask_default
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+
+# Dates as ISO 8601 (what the API accepts on input), Decimals as exact strings
+def json_default(obj):
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    return flask_default(obj)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson when it is installed.
+
+    Dates and datetimes are written as ISO 8601 and Decimals as strings,
+    with or without orjson. Responses are built straight from the encoded
+    bytes instead of going through an intermediate str.
+    """
+
+    default = staticmethod(json_default)
+
+    def encode(self, obj, pretty=False):
+        """``obj`` as UTF-8 encoded JSON."""
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except orjson.JSONEncodeError:
+                pass  # e.g. integers wider than 64 bits; the stdlib encoder handles them
+        return json.dumps(
+            obj, default=self.default, sort_keys=self.sort_keys, ensure_ascii=self.ensure_ascii,
+            indent=2 if pretty else None, separators=None if pretty else (",", ":"),
+        ).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, pretty) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,168 @@
+import threading
+import time
+
+from flask import g, has_app_context, request
+
+from fastjson import FastJSONProvider
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.labels, labels), value) for labels, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            entry = self._values.setdefault(labels, [0] * len(self.buckets) + [0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, entry in self._values.items():
+                for bound, count in zip(self.buckets, entry):
+                    samples.append((f"{self.name}_bucket", _format_labels(self.labels + ("le",), labels + (bound,)), count))
+                samples.append((f"{self.name}_bucket", _format_labels(self.labels + ("le",), labels + ("+Inf",)), entry[-1]))
+                samples.append((f"{self.name}_sum", _format_labels(self.labels, labels), entry[-2]))
+                samples.append((f"{self.name}_count", _format_labels(self.labels, labels), entry[-1]))
+        return samples
+
+
+class Gauge:
+    """Metric read at scrape time from ``collect``, which returns {label values: value}.
+
+    Pass ``kind="counter"`` for totals that something else already keeps.
+    """
+
+    def __init__(self, name, help_text, labels, collect, kind="gauge"):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.collect = collect
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labels, labels), value) for labels, value in self.collect().items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += [f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples()]
+        return "\n".join(lines) + "\n"
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """JSON provider that adds the time spent encoding to the current request's tally."""
+
+    def encode(self, obj, pretty=False):
+        start = time.perf_counter()
+        try:
+            return super().encode(obj, pretty)
+        finally:
+            if has_app_context() and "metrics_json_time" in g:
+                g.metrics_json_time += time.perf_counter() - start
+
+
+class RequestMetrics:
+    """Per-endpoint latency, status, DB query and JSON encoding metrics for a Flask app.
+
+    Endpoints are labelled by URL rule (e.g. ``/pets/<int:pet_id>``) so IDs do
+    not multiply the series. Metrics are kept per process.
+    """
+
+    def __init__(self, app=None, registry=None):
+        self.registry = registry or Registry()
+        self.latency = self.registry.register(Histogram(
+            "http_request_duration_seconds", "Time spent handling a request.", ("endpoint", "method")))
+        self.responses = self.registry.register(Counter(
+            "http_responses_total", "Responses sent, by status code.", ("endpoint", "method", "status")))
+        self.db_queries = self.registry.register(Histogram(
+            "db_queries_per_request", "Database statements executed per request.", ("endpoint",), COUNT_BUCKETS))
+        self.db_time = self.registry.register(Histogram(
+            "db_time_per_request_seconds", "Time spent executing database statements per request.", ("endpoint",)))
+        self.json_time = self.registry.register(Histogram(
+            "json_serialization_seconds", "Time spent encoding JSON per request.", ("endpoint",)))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_db_queries = 0
+        g.metrics_db_time = 0.0
+        g.metrics_json_time = 0.0
+
+    def _after_request(self, response):
+        if "metrics_start" not in g:
+            return response
+        endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+        self.latency.observe((endpoint, request.method), time.perf_counter() - g.metrics_start)
+        self.responses.inc((endpoint, request.method, str(response.status_code)))
+        self.db_queries.observe((endpoint,), g.metrics_db_queries)
+        self.db_time.observe((endpoint,), g.metrics_db_time)
+        self.json_time.observe((endpoint,), g.metrics_json_time)
+        return response
+
+    # Query hook for storage.Database: tally every statement against the current request
+    def record_query(self, query, params, elapsed):
+        if "metrics_db_queries" in g:
+            g.metrics_db_queries += 1
+            g.metrics_db_time += elapsed
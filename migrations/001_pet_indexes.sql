@@ -0,0 +1,21 @@
+-- Composite indexes backing the GET /pets filters and sort orders.
+-- Apply once against the animal_shelter database:
+--     mysql -u root -p animal_shelter < migrations/001_pet_indexes.sql
+--
+-- InnoDB appends the primary key to every secondary index, so each of these
+-- also covers the (column, pet_id) keyset comparison used for pagination.
+
+-- ?adopted=false&species_id=1&sort=-date_arrived (kennel screen)
+CREATE INDEX idx_pet_adopted_species_arrived ON Pet (adopted, species_id, date_arrived);
+
+-- ?adopted=false&sort=date_arrived, ?adopted=...&arrived_from=...
+CREATE INDEX idx_pet_adopted_arrived ON Pet (adopted, date_arrived);
+
+-- ?species_id=1 with or without a date range
+CREATE INDEX idx_pet_species_arrived ON Pet (species_id, date_arrived);
+
+-- ?gender=Female with a date range or date sort
+CREATE INDEX idx_pet_gender_arrived ON Pet (gender, date_arrived);
+
+-- ?sort=date_arrived and ?arrived_from=...&arrived_to=... on their own
+CREATE INDEX idx_pet_arrived ON Pet (date_arrived);
@@ -0,0 +1,13 @@
+-- Per-table change counters used to compute ETags for the collection routes.
+-- Every write handler increments its table's row in the same transaction as
+-- the write, so a GET only needs one primary-key lookup to know whether the
+-- client's copy is still current.
+--     mysql -u root -p animal_shelter < migrations/002_table_version.sql
+
+CREATE TABLE IF NOT EXISTS Table_Version (
+    table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+    version    BIGINT UNSIGNED NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO Table_Version (table_name) VALUES
+    ('Species'), ('Pet'), ('Adoption'), ('Medical_Record');
@@ -0,0 +1,9 @@
+-- Lookups by pet_id behind GET /pets/<pet_id>/profile.
+--     mysql -u root -p animal_shelter < migrations/003_pet_id_indexes.sql
+--
+-- InnoDB already indexes these foreign key columns implicitly and drops the
+-- implicit index once these take over; SQLite does not index foreign keys
+-- at all, so the schema declares them explicitly for both backends.
+
+CREATE INDEX idx_adoption_pet ON Adoption (pet_id);
+CREATE INDEX idx_medical_record_pet ON Medical_Record (pet_id);
@@ -0,0 +1,18 @@
+-- Per-species summary behind GET /stats: pets, pets still in the shelter,
+-- adoptions, and the total and count of completed stays (date_arrived to
+-- date_adopted) for the average. The write handlers adjust it in the same
+-- transaction as each write; fill it once, and whenever it needs
+-- recomputing, with `flask --app api rebuild-stats`.
+--     mysql -u root -p animal_shelter < migrations/004_species_stats.sql
+
+CREATE TABLE IF NOT EXISTS Species_Stats (
+    species_id INT NOT NULL PRIMARY KEY,
+    pets       INT NOT NULL DEFAULT 0,
+    in_shelter INT NOT NULL DEFAULT 0,
+    adoptions  INT NOT NULL DEFAULT 0,
+    stay_days  BIGINT NOT NULL DEFAULT 0,
+    stays      INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (species_id) REFERENCES Species (species_id) ON DELETE CASCADE
+);
+
+INSERT IGNORE INTO Table_Version (table_name) VALUES ('Species_Stats');
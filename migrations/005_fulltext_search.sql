@@ -0,0 +1,9 @@
+-- Full-text indexes behind GET /search.
+--     mysql -u root -p animal_shelter < migrations/005_fulltext_search.sql
+--
+-- Queries run in BOOLEAN MODE with every word required as a prefix
+-- ("+max* +labrador*"). InnoDB skips words shorter than
+-- innodb_ft_min_token_size (3 by default) and its built-in stopwords.
+
+CREATE FULLTEXT INDEX ft_pet ON Pet (name, breed_name);
+CREATE FULLTEXT INDEX ft_medical_record ON Medical_Record (treatment_details, veterinarian);
@@ -0,0 +1,13 @@
+-- Change feed behind GET /changes. The write handlers append one row per
+-- inserted, updated or deleted Species, Pet, Adoption or Medical_Record row
+-- (cascaded deletes included) in the same transaction as the write.
+--     mysql -u root -p animal_shelter < migrations/006_change_log.sql
+
+CREATE TABLE IF NOT EXISTS Change_Log (
+    change_id  INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    row_id     INT NOT NULL,
+    operation  VARCHAR(6) NOT NULL
+);
+
+INSERT IGNORE INTO Table_Version (table_name) VALUES ('Change_Log');
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections.
+
+    ``connect`` opens a new connection. At most ``max_size`` connections are
+    open at once; a checkout waits up to ``timeout`` seconds for one to be
+    returned before raising PoolTimeout. Connections older than ``recycle``
+    seconds are replaced, and idle ones are pinged before reuse if they have
+    not been used for ``ping_interval`` seconds.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0, recycle=3600, ping_interval=30,
+                 ping=lambda conn: conn.ping()):
+        self._connect = connect
+        self._ping = ping
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._created = {}  # id(conn) -> created_at, for connections checked out
+        self._size = 0
+        self._filled = False
+        self._cond = threading.Condition()
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.recycled = 0
+
+    def _open(self):
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _alive(self, conn):
+        try:
+            self._ping(conn)
+            return True
+        except Exception:
+            return False
+
+    # Open min_size connections up front, on the first checkout. Slots are reserved one at
+    # a time, so a failed connect gives back only its own slot, and the next checkout
+    # finishes the fill.
+    def _fill(self):
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    self._filled = True
+                    return
+                self._size += 1
+            conn = self._open()
+            now = time.monotonic()
+            with self._cond:
+                self._idle.append((conn, now, now))
+                self._cond.notify()
+
+    def acquire(self):
+        if not self._filled:
+            self._fill()
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No database connection available within {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+        now = time.monotonic()
+        if conn is not None and now - created_at > self.recycle:
+            self._discard(conn)
+            conn = None
+            self.recycled += 1
+        elif conn is not None and now - last_used > self.ping_interval and not self._alive(conn):
+            self._discard(conn)
+            conn = None
+            self.recycled += 1
+        if conn is None:
+            conn = self._open()
+            created_at = now
+
+        wait_time = time.monotonic() - start
+        with self._cond:
+            self._created[id(conn)] = created_at
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+        return conn
+
+    # Return a connection, rolling back anything left uncommitted; broken ones are closed
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            created_at = self._created.pop(id(conn), time.monotonic())
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "in_use": self._size - idle,
+                "idle": idle,
+                "max_size": self.max_size,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time_total": round(self.wait_time_total, 6),
+                "wait_time_max": round(self.wait_time_max, 6),
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+            }
@@ -0,0 +1,106 @@
+import logging
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger("animal_shelter.queries")
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised after a request that ran more statements than its route's budget, when QUERY_BUDGET_FAIL is on."""
+
+
+def describe_params(params):
+    """Shape of a statement's parameters without their values, e.g. ``(int, str)`` or ``500 x (str, int)``."""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        return f"{len(params)} x {describe_params(params[0])}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+    return type(params).__name__
+
+
+class QueryMonitor:
+    """Opt-in slow-query log and per-request statement budget.
+
+    Enabled with ``QUERY_MONITOR_ENABLED``. Statements slower than
+    ``SLOW_QUERY_THRESHOLD`` seconds are logged with the route and the shape
+    of their parameters, and with their plan when ``SLOW_QUERY_EXPLAIN`` is
+    set. The plan is captured after the handler returns, so EXPLAIN never
+    interleaves with a result the handler is still reading.
+
+    A request that runs more statements than its route's budget (set with
+    ``budget``, else ``QUERY_BUDGET_DEFAULT``) is logged, or fails with
+    QueryBudgetExceeded when ``QUERY_BUDGET_FAIL`` is on (by default, in
+    testing mode).
+    """
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        self.budgets = {}  # endpoint -> statements allowed per request, None for unlimited
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        app.config.setdefault("QUERY_MONITOR_ENABLED", False)
+        app.config.setdefault("SLOW_QUERY_THRESHOLD", 0.1)
+        app.config.setdefault("SLOW_QUERY_EXPLAIN", False)
+        app.config.setdefault("QUERY_BUDGET_DEFAULT", 20)
+        app.config.setdefault("QUERY_BUDGET_FAIL", None)
+        db.query_hooks.append(self.record_query)
+        app.after_request(self._after_request)
+
+    # Route decorator: allow the endpoint up to ``limit`` statements per request (None for no limit)
+    def budget(self, limit):
+        def decorator(f):
+            self.budgets[f.__name__] = limit
+            return f
+        return decorator
+
+    def _enabled(self):
+        return self.app.config["QUERY_MONITOR_ENABLED"] and has_request_context()
+
+    def record_query(self, query, params, elapsed):
+        if not self._enabled():
+            return
+        g.query_monitor_count = g.get("query_monitor_count", 0) + 1
+        if elapsed >= self.app.config["SLOW_QUERY_THRESHOLD"]:
+            route = request.url_rule.rule if request.url_rule else request.path
+            g.setdefault("query_monitor_slow", []).append((route, query, params, elapsed))
+
+    def _explain(self, query, params):
+        conn = g.get("db_conn")
+        if conn is None or not query.lstrip().upper().startswith("SELECT"):
+            return None
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self.db.storage.explain + query, params)
+            return cursor.fetchall()
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+        finally:
+            cursor.close()
+
+    def _after_request(self, response):
+        if not self._enabled():
+            return response
+        for route, query, params, elapsed in g.pop("query_monitor_slow", []):
+            plan = self._explain(query, params) if self.app.config["SLOW_QUERY_EXPLAIN"] else None
+            logger.warning("Slow query on %s %s (%.1f ms, params %s): %s%s", request.method, route, elapsed * 1000,
+                           describe_params(params), " ".join(query.split()), f"\n  plan: {plan}" if plan else "")
+
+        count = g.pop("query_monitor_count", 0)
+        limit = self.budgets.get(request.endpoint, self.app.config["QUERY_BUDGET_DEFAULT"])
+        if limit is not None and count > limit:
+            message = f"{request.method} {request.path} ran {count} statements, over its budget of {limit}"
+            fail = self.app.config["QUERY_BUDGET_FAIL"]
+            if fail is None:
+                fail = self.app.testing
+            if fail:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
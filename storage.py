@@ -0,0 +1,483 @@
+import datetime
+import itertools
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from flask import g
+
+from pool import ConnectionPool
+
+# The one schema both backends are created from. Column order matches the
+# row layout the routes read from SELECT *.
+# table -> (columns, foreign keys, indexes); "pk" marks the auto-increment primary key.
+SCHEMA = {
+    "Species": (
+        [("species_id", "pk"),
+         ("species_name", "VARCHAR(100) NOT NULL")],
+        [],
+        [],
+    ),
+    "Pet": (
+        [("pet_id", "pk"),
+         ("name", "VARCHAR(100) NOT NULL"),
+         ("species_id", "INT NOT NULL"),
+         ("breed_name", "VARCHAR(100)"),
+         ("age", "INT"),
+         ("color", "VARCHAR(50)"),
+         ("gender", "VARCHAR(10)"),
+         ("adopted", "BOOLEAN NOT NULL DEFAULT FALSE"),
+         ("date_arrived", "DATE"),
+         ("date_adopted", "DATE")],
+        [("species_id", "Species", "species_id")],
+        [("idx_pet_adopted_species_arrived", ("adopted", "species_id", "date_arrived")),
+         ("idx_pet_adopted_arrived", ("adopted", "date_arrived")),
+         ("idx_pet_species_arrived", ("species_id", "date_arrived")),
+         ("idx_pet_gender_arrived", ("gender", "date_arrived")),
+         ("idx_pet_arrived", ("date_arrived",))],
+    ),
+    "Adoption": (
+        [("adoption_id", "pk"),
+         ("pet_id", "INT NOT NULL"),
+         ("first_name", "VARCHAR(100) NOT NULL"),
+         ("last_name", "VARCHAR(100) NOT NULL"),
+         ("address", "TEXT"),
+         ("email", "VARCHAR(255)"),
+         ("phone", "VARCHAR(30)"),
+         ("adoption_date", "DATE NOT NULL"),
+         ("date_returned", "DATE")],
+        [("pet_id", "Pet", "pet_id")],
+        [("idx_adoption_pet", ("pet_id",))],
+    ),
+    "Medical_Record": (
+        [("treatment_id", "pk"),
+         ("pet_id", "INT NOT NULL"),
+         ("treatment_date", "DATE NOT NULL"),
+         ("treatment_details", "TEXT NOT NULL"),
+         ("veterinarian", "VARCHAR(100) NOT NULL")],
+        [("pet_id", "Pet", "pet_id")],
+        [("idx_medical_record_pet", ("pet_id",))],
+    ),
+    "Species_Stats": (
+        [("species_id", "INT NOT NULL PRIMARY KEY"),
+         ("pets", "INT NOT NULL DEFAULT 0"),
+         ("in_shelter", "INT NOT NULL DEFAULT 0"),
+         ("adoptions", "INT NOT NULL DEFAULT 0"),
+         ("stay_days", "BIGINT NOT NULL DEFAULT 0"),
+         ("stays", "INT NOT NULL DEFAULT 0")],
+        [("species_id", "Species", "species_id")],
+        [],
+    ),
+    "Change_Log": (
+        [("change_id", "pk"),
+         ("table_name", "VARCHAR(64) NOT NULL"),
+         ("row_id", "INT NOT NULL"),
+         ("operation", "VARCHAR(6) NOT NULL")],
+        [],
+        [],
+    ),
+    "Table_Version": (
+        [("table_name", "VARCHAR(64) NOT NULL PRIMARY KEY"),
+         ("version", "BIGINT NOT NULL DEFAULT 0")],
+        [],
+        [],
+    ),
+}
+
+# Full-text search: table -> (primary key, indexed text columns). MySQL uses FULLTEXT
+# indexes; SQLite an FTS5 inverted index kept in step with the table by triggers.
+SEARCH = {
+    "Pet": ("pet_id", ("name", "breed_name")),
+    "Medical_Record": ("treatment_id", ("treatment_details", "veterinarian")),
+}
+
+SEED = [
+    ("INSERT INTO Table_Version (table_name, version) VALUES (%s, 0)", [(table,) for table in
+        ("Species", "Pet", "Adoption", "Medical_Record", "Species_Stats", "Change_Log")]),
+]
+
+
+def schema_statements(primary_key):
+    """CREATE statements for SCHEMA, with ``primary_key`` as the auto-increment column type."""
+    statements = []
+    for table, (columns, foreign_keys, indexes) in SCHEMA.items():
+        lines = [f"{name} {primary_key if kind == 'pk' else kind}" for name, kind in columns]
+        lines += [
+            f"FOREIGN KEY ({column}) REFERENCES {parent} ({parent_column}) ON DELETE CASCADE"
+            for column, parent, parent_column in foreign_keys
+        ]
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ",\n    ".join(lines) + "\n)")
+        statements += [f"CREATE INDEX {name} ON {table} ({', '.join(cols)})" for name, cols in indexes]
+    return statements
+
+
+class MySQLStorage:
+    """MySQL backend: pooled MySQLdb connections configured from the MYSQL_* keys."""
+
+    primary_key = "INT NOT NULL AUTO_INCREMENT PRIMARY KEY"
+    explain = "EXPLAIN "
+    lock_rows = " FOR UPDATE"
+
+    def __init__(self, config):
+        self.config = config
+        self.pool = ConnectionPool(
+            self._connect,
+            min_size=config["MYSQL_POOL_MIN_SIZE"],
+            max_size=config["MYSQL_POOL_MAX_SIZE"],
+            timeout=config["MYSQL_POOL_TIMEOUT"],
+            recycle=config["MYSQL_POOL_RECYCLE"],
+            ping_interval=config["MYSQL_POOL_PING_INTERVAL"],
+        )
+
+    def _connect(self):
+        import MySQLdb
+
+        kwargs = {
+            "host": self.config["MYSQL_HOST"],
+            "user": self.config["MYSQL_USER"],
+            "passwd": self.config["MYSQL_PASSWORD"],
+            "db": self.config["MYSQL_DB"],
+            "port": self.config.get("MYSQL_PORT", 3306),
+            "charset": self.config.get("MYSQL_CHARSET", "utf8mb4"),
+        }
+        return MySQLdb.connect(**{key: value for key, value in kwargs.items() if value is not None})
+
+    def acquire(self):
+        return self.pool.acquire()
+
+    def release(self, conn):
+        self.pool.release(conn)
+
+    # Unbuffered cursor: rows stay on the server until fetched
+    def stream_cursor(self, conn):
+        import MySQLdb.cursors
+
+        return conn.cursor(MySQLdb.cursors.SSCursor)
+
+    def search_statement(self, table, terms):
+        """SELECT of ``table`` rows containing every term (as a prefix), best first, with
+        the score as an extra last column. Returns (query, params); the query ends in
+        LIMIT %s OFFSET %s, whose values the caller appends to params.
+        """
+        key, columns = SEARCH[table]
+        match = f"MATCH ({', '.join(columns)}) AGAINST (%s IN BOOLEAN MODE)"
+        expression = " ".join(f"+{term}*" for term in terms)
+        query = f"SELECT *, {match} AS score FROM {table} WHERE {match} ORDER BY score DESC, {key} LIMIT %s OFFSET %s"
+        return query, (expression, expression)
+
+    def create_schema(self):
+        conn = self.acquire()
+        try:
+            cursor = conn.cursor()
+            statements = schema_statements(self.primary_key) + [
+                f"CREATE FULLTEXT INDEX ft_{table.lower()} ON {table} ({', '.join(columns)})"
+                for table, (_, columns) in SEARCH.items()
+            ]
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except Exception as e:
+                    # 1061: duplicate index name, i.e. the index already exists
+                    if getattr(e, "args", (None,))[0] != 1061:
+                        raise
+            for query, rows in SEED:
+                cursor.executemany(query.replace("INSERT", "INSERT IGNORE", 1), rows)
+            conn.commit()
+        finally:
+            self.release(conn)
+
+
+class SQLiteCursor:
+    """DB-API cursor over sqlite3 that accepts MySQLdb-style %s placeholders.
+
+    Like MySQLdb, ``lastrowid`` after an INSERT executemany is the ID of the
+    first row inserted.
+    """
+
+    PLACEHOLDER = re.compile(r"%([s%])")
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.lastrowid = None
+        self.max_stmt_length = None
+
+    @classmethod
+    def translate(cls, query):
+        return cls.PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", query)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=None):
+        self._cursor.execute(self.translate(query), params or ())
+        self.lastrowid = self._cursor.lastrowid
+        return self
+
+    def executemany(self, query, rows):
+        rows = list(rows)
+        self._cursor.executemany(self.translate(query), rows)
+        if query.lstrip().upper().startswith("INSERT") and rows:
+            last = self._cursor.connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.lastrowid = last - len(rows) + 1
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args):
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def ping(self):
+        self._conn.execute("SELECT 1")
+
+
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_converter("DATE", lambda value: datetime.date.fromisoformat(value.decode()))
+
+
+class SQLiteStorage:
+    """SQLite backend on a database file, or on a private in-memory database for ':memory:'.
+
+    Uses the same schema and SQL as the MySQL backend, so tests and benchmarks
+    can run against a real SQL engine without a server.
+    """
+
+    primary_key = "INTEGER PRIMARY KEY AUTOINCREMENT"
+    explain = "EXPLAIN QUERY PLAN "
+    lock_rows = ""  # SQLite has no row locks; its first write locks the whole database
+    _memory_ids = itertools.count()
+
+    def __init__(self, path=":memory:", max_size=10, timeout=5):
+        if path == ":memory:":
+            # Every connection to a shared-cache URI sees the same database; the
+            # keeper connection holds it open for the lifetime of the storage
+            self.path = f"file:animal_shelter_{next(self._memory_ids)}?mode=memory&cache=shared"
+        else:
+            self.path = path
+        self.pool = ConnectionPool(self._connect, min_size=0, max_size=max_size, timeout=timeout)
+        self._keeper = self._connect()
+        if path == ":memory:":
+            self.create_schema()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path, uri=self.path.startswith("file:"), timeout=5,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+        )
+        conn.execute("PRAGMA foreign_keys = ON")
+        if not self.path.startswith("file:"):
+            conn.execute("PRAGMA journal_mode = WAL")
+        return SQLiteConnection(conn)
+
+    def acquire(self):
+        return self.pool.acquire()
+
+    def release(self, conn):
+        self.pool.release(conn)
+
+    # sqlite3 cursors already step through results lazily
+    def stream_cursor(self, conn):
+        return conn.cursor()
+
+    def search_statement(self, table, terms):
+        """Same contract as MySQLStorage.search_statement, answered from the FTS5 index."""
+        key, _ = SEARCH[table]
+        expression = " ".join(f'"{term}"*' for term in terms)
+        query = (
+            f"SELECT {table}.*, -{table}_Search.rank AS score FROM {table}_Search "
+            f"JOIN {table} ON {table}.{key} = {table}_Search.rowid "
+            f"WHERE {table}_Search MATCH %s ORDER BY {table}_Search.rank, {table}.{key} LIMIT %s OFFSET %s"
+        )
+        return query, (expression,)
+
+    @staticmethod
+    def search_schema(table):
+        key, columns = SEARCH[table]
+        index = f"{table}_Search"
+        names = ", ".join(columns)
+        new = ", ".join(f"new.{column}" for column in columns)
+        old = ", ".join(f"old.{column}" for column in columns)
+        add = f"INSERT INTO {index} (rowid, {names}) VALUES (new.{key}, {new});"
+        remove = f"INSERT INTO {index} ({index}, rowid, {names}) VALUES ('delete', old.{key}, {old});"
+        return [
+            f"CREATE VIRTUAL TABLE {index} USING fts5({names}, content='{table}', content_rowid='{key}', prefix='2 3')",
+            f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN {add} END",
+            f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN {remove} END",
+            f"CREATE TRIGGER {index}_update AFTER UPDATE OF {names} ON {table} BEGIN {remove} {add} END",
+            # Index the rows the table already holds
+            f"INSERT INTO {index} ({index}) VALUES ('rebuild')",
+        ]
+
+    def create_schema(self):
+        conn = self._keeper._conn
+        for statement in schema_statements(self.primary_key):
+            conn.execute(statement.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+        for table in SEARCH:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table}_Search",)).fetchone():
+                for statement in self.search_schema(table):
+                    conn.execute(statement)
+        for query, rows in SEED:
+            conn.executemany(SQLiteCursor.translate(query.replace("INSERT", "INSERT OR IGNORE", 1)), rows)
+        conn.commit()
+
+
+def storage_from_config(config):
+    if config["STORAGE_BACKEND"] == "sqlite":
+        return SQLiteStorage(config["SQLITE_PATH"])
+    if config["STORAGE_BACKEND"] == "mysql":
+        return MySQLStorage(config)
+    raise ValueError(f"Unknown STORAGE_BACKEND {config['STORAGE_BACKEND']!r}")
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that reports each statement and its run time to the query hooks."""
+
+    def __init__(self, cursor, hooks):
+        self.__dict__["_cursor"] = cursor
+        self.__dict__["_hooks"] = hooks
+
+    def _timed(self, method, query, params):
+        start = time.perf_counter()
+        try:
+            return method(query, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in self._hooks:
+                hook(query, params, elapsed)
+
+    def execute(self, query, params=None):
+        return self._timed(self._cursor.execute, query, params)
+
+    def executemany(self, query, rows):
+        return self._timed(self._cursor.executemany, query, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, hooks):
+        self._conn = conn
+        self._hooks = hooks
+
+    def cursor(self, *args):
+        return InstrumentedCursor(self._conn.cursor(*args), self._hooks)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class TransactionConnection:
+    """Connection handed out inside Database.transaction: commits wait for the end of the
+    block, and a rollback marks the whole transaction as failed."""
+
+    def __init__(self, conn, state):
+        self._conn = conn
+        self._state = state
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self._conn.rollback()
+        self._state["rollback"] = True
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class TransactionRolledBack(Exception):
+    """Raised at the end of a Database.transaction that was rolled back without an exception."""
+
+
+class Database:
+    """Flask extension giving each app context one connection from the storage backend.
+
+    ``db.connection`` is a DB-API connection using %s placeholders whichever
+    backend is configured; it goes back to the backend's pool on teardown.
+    Every statement run through it is passed to each of ``query_hooks`` as
+    ``hook(query, params, elapsed_seconds)``.
+    """
+
+    def __init__(self, app=None, storage=None):
+        self.storage = storage
+        self.query_hooks = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("STORAGE_BACKEND", "mysql")
+        app.config.setdefault("SQLITE_PATH", ":memory:")
+        if self.storage is None:
+            self.storage = storage_from_config(app.config)
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def connection(self):
+        if "db_conn" not in g:
+            g.db_conn = self.storage.acquire()
+        conn = g.db_conn
+        if self.query_hooks:
+            conn = InstrumentedConnection(conn, self.query_hooks)
+        if "db_transaction" in g:
+            conn = TransactionConnection(conn, g.db_transaction)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run the block as one transaction. ``commit()`` calls inside it are deferred to
+        its end; it is rolled back if the block raises, anything inside rolls back, or
+        the block sets ``state["rollback"]`` on the yielded state."""
+        state = {"rollback": False}
+        g.db_transaction = state
+        try:
+            yield state
+        except BaseException:
+            g.pop("db_transaction", None)
+            self.connection.rollback()
+            raise
+        g.pop("db_transaction", None)
+        if state["rollback"]:
+            self.connection.rollback()
+            raise TransactionRolledBack("The transaction was rolled back")
+        self.connection.commit()
+
+    def stream_cursor(self):
+        return self.storage.stream_cursor(self.connection)
+
+    def teardown(self, exception):
+        conn = g.pop("db_conn", None)
+        if conn is not None:
+            self.storage.release(conn)
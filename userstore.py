@@ -0,0 +1,186 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class UserStore:
+    """User accounts kept in an embedded SQLite file.
+
+    Every worker process opens the same file, so a registration made in one
+    worker is immediately visible to the others. Lookups go through the
+    primary-key index and writes touch a single row, so neither depends on
+    the number of accounts.
+    """
+
+    def __init__(self, path, legacy_file=None):
+        self.path = path
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                password TEXT NOT NULL,
+                role     TEXT NOT NULL,
+                token    TEXT,
+                token_version INTEGER NOT NULL DEFAULT 0,
+                revoked_at    REAL
+            )
+        """)
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(users)")]
+        if "token_version" not in columns:
+            conn.execute("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0")
+        if "revoked_at" not in columns:
+            conn.execute("ALTER TABLE users ADD COLUMN revoked_at REAL")
+        # Only users whose tokens were ever revoked, ordered by when, so reading the recent
+        # revocations is a short range scan
+        conn.execute("DROP INDEX IF EXISTS idx_users_revoked")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_revoked_at ON users (revoked_at) WHERE revoked_at IS NOT NULL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS refresh_tokens (
+                token_hash BLOB PRIMARY KEY,
+                username   TEXT NOT NULL,
+                family     TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                used       INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family ON refresh_tokens (family)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires ON refresh_tokens (expires_at)")
+        if legacy_file:
+            self._import_legacy(legacy_file)
+
+    # One connection per thread; sqlite3 connections must not be shared across threads
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # One-off import of the old users.json file; existing accounts are left untouched
+    def _import_legacy(self, legacy_file):
+        try:
+            with open(legacy_file, "r") as file:
+                legacy_users = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, password, role, token) VALUES (?, ?, ?, ?)",
+                [(username, user["password"], user.get("role", "users"), user.get("token"))
+                 for username, user in legacy_users.items()],
+            )
+
+    def get(self, username, default=None):
+        row = self._connection().execute(
+            "SELECT * FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return dict(row) if row else default
+
+    def __contains__(self, username):
+        return self._connection().execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)
+        ).fetchone() is not None
+
+    # Returns False if the username is already taken
+    def create(self, username, password, role):
+        try:
+            self._connection().execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                (username, password, role),
+            )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    # Changing the role revokes the user's tokens, which carry the old role as a claim
+    def update(self, username, password=None, role=None):
+        fields = {"password": password, "role": role}
+        fields = {column: value for column, value in fields.items() if value is not None}
+        if not fields:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        if role is not None:
+            # SET expressions see the old role
+            assignments += ", token_version = token_version + (role != ?), revoked_at = CASE WHEN role != ? THEN ? ELSE revoked_at END"
+            fields.update(role_changed=role, role_revoked=role, revoked_at=time.time())
+        self._connection().execute(
+            f"UPDATE users SET {assignments} WHERE username = ?", (*fields.values(), username)
+        )
+
+    # Users whose tokens were revoked after `since` (a Unix time), with the token version
+    # their tokens must carry now
+    def revocations(self, since):
+        return dict(self._connection().execute(
+            "SELECT username, token_version FROM users WHERE revoked_at > ?", (since,)
+        ).fetchall())
+
+    # Refresh tokens are kept as SHA-256 hashes. Expired ones are purged as new ones are added.
+    def add_refresh_token(self, token_hash, username, family, expires_at):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM refresh_tokens WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                "INSERT INTO refresh_tokens (token_hash, username, family, expires_at) VALUES (?, ?, ?, ?)",
+                (token_hash, username, family, expires_at),
+            )
+
+    # Swap a refresh token for a new one of the same family; returns the username, or None if
+    # the token is unknown, expired or already used. Reuse of a used token (a sign that it
+    # leaked) revokes its whole family, including the token that replaced it.
+    def rotate_refresh_token(self, token_hash, new_token_hash, expires_at):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT username, family, expires_at, used FROM refresh_tokens WHERE token_hash = ?", (token_hash,)
+            ).fetchone()
+            if row is None or row["expires_at"] <= time.time():
+                return None
+            if row["used"]:
+                conn.execute("DELETE FROM refresh_tokens WHERE family = ?", (row["family"],))
+                return None
+            conn.execute("UPDATE refresh_tokens SET used = 1 WHERE token_hash = ?", (token_hash,))
+            conn.execute(
+                "INSERT INTO refresh_tokens (token_hash, username, family, expires_at) VALUES (?, ?, ?, ?)",
+                (new_token_hash, row["username"], row["family"], expires_at),
+            )
+            return row["username"]
+
+
+class RevocationList:
+    """Per-process copy of the store's revocations, reloaded every ``refresh`` seconds.
+
+    A token is revoked if its ``ver`` claim is older than its user's current
+    token version. Checking one is a dict lookup; a revocation made in any
+    worker takes effect everywhere within ``refresh`` seconds. Only the
+    revocations of the last ``window`` seconds (the access token lifetime)
+    are loaded: every token issued before an older one has expired anyway.
+    """
+
+    def __init__(self, store, refresh=10, window=900, clock=time.monotonic):
+        self.store = store
+        self.refresh = refresh
+        self.window = window
+        self.clock = clock
+        self._versions = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, claims):
+        if self._loaded_at is None or self.clock() - self._loaded_at >= self.refresh:
+            self.reload()
+        return claims.get("ver", 0) < self._versions.get(claims.get("username"), 0)
+
+    def reload(self):
+        with self._lock:
+            self._versions = self.store.revocations(time.time() - self.window)
+            self._loaded_at = self.clock()